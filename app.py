@@ -1,6 +1,8 @@
+import json
 import os
-import pickle
-import re
+import secrets
+import time
+from collections.abc import Iterator
 from pathlib import Path
 
 from dotenv import load_dotenv
@@ -13,6 +15,7 @@ from flask import (
     render_template,
     request,
     send_file,
+    stream_with_context,
     url_for,
 )
 from flask_bootstrap import Bootstrap5
@@ -22,19 +25,35 @@ from wtforms.validators import DataRequired
 
 from generate_webpage import (
     BASE_FOLDER,
+    get_catalog,
     get_course_from_alias,
     get_course_from_course_code,
-    get_years,
+    get_course_from_location,
     part_to_year_number,
     term_name_to_number,
 )
-from html_fixing import fix_paginated_html
-from search import search_htmls
-from source_items import Item
+from html_fixing import fix_paginated_html, render_cache
+from http_caching import conditional_response, make_etag, stat_etag
+from metrics import METRICS_TOKEN, registry, request_duration, requests_total
+from precompressed import send_precompressed
+from profiling import PROFILE_REQUESTS, RequestProfiler
+from scoped_css import STYLESHEET_MAX_AGE, scope_stylesheet, scoped_stylesheets
+from search import (
+    SEARCH_PAGE_SIZE,
+    iter_search_htmls,
+    page_href,
+    search_htmls,
+    search_window,
+)
+from source_items import list_directory
+from suggest_index import SUGGEST_LIMIT, SUGGEST_MAX_LIMIT, suggest_index
 
 app = Flask(__name__)
 Bootstrap5(app)
 
+if PROFILE_REQUESTS:
+    app.wsgi_app = RequestProfiler(app.wsgi_app)
+
 
 class SearchForm(FlaskForm):
     q = StringField("Search", validators=[DataRequired()])
@@ -49,9 +68,19 @@ class SearchForm(FlaskForm):
 
 @app.before_request
 def before_request():
+    g.request_start = time.perf_counter()
     g.search_form = SearchForm()
 
 
+@app.after_request
+def after_request(response: Response) -> Response:
+    if (start := g.get("request_start")) is not None:
+        route = request.url_rule.endpoint if request.url_rule else "unmatched"
+        request_duration.observe(route, value=time.perf_counter() - start)
+        requests_total.inc(route, str(response.status_code))
+    return response
+
+
 def html_url_to_file_url(year: str, term: str, course: str) -> Path | None:
     if not (part := part_to_year_number(year)):
         return None
@@ -75,7 +104,11 @@ def notes_pdf(year: str, term: str, course: str, pdf_file: str):
 def notes_sources(year: str, term: str, course_code: str, file_path: str):
     if not (folder := html_url_to_file_url(year, term, course_code)):
         return abort(404)
-    if not (course := get_course_from_course_code(course_code)):
+    if not (
+        course := get_course_from_location(
+            folder.parent.parent.name, folder.parent.name, course_code
+        )
+    ):
         return abort(404)
     file = folder / file_path
     if file.is_dir():
@@ -90,26 +123,38 @@ def notes_sources(year: str, term: str, course_code: str, file_path: str):
                 ),
                 code=301,
             )
-        term_folder = folder.parent
-        relative_path = os.path.relpath(file, term_folder)
-        base_url = url_for(
-            "notes_sources", year=year, term=term, course_code=course_code
-        )
-        url_extra = ""
-        breadcrumbs = [
-            (
-                p,
-                base_url
-                + (url_extra := url_extra + (f"{p}/" if p != course_code else "")),
+
+        def render_listing() -> str:
+            term_folder = folder.parent
+            relative_path = os.path.relpath(file, term_folder)
+            base_url = url_for(
+                "notes_sources", year=year, term=term, course_code=course_code
             )
-            for p in relative_path.split("/")
-        ]
-        return render_template(
-            "sources_dir.html",
-            course_name=course.course_name,
-            folder_name=f"{course_code}/{file_path}",
-            items=sorted(Item(i) for i in file.glob("*") if i.name != "result"),
-            breadcrumbs=breadcrumbs,
+            url_extra = ""
+            breadcrumbs = [
+                (
+                    p,
+                    base_url
+                    + (url_extra := url_extra + (f"{p}/" if p != course_code else "")),
+                )
+                for p in relative_path.split("/")
+            ]
+            return render_template(
+                "sources_dir.html",
+                course_name=course.course_name,
+                folder_name=f"{course_code}/{file_path}",
+                items=list_directory(file),
+                breadcrumbs=breadcrumbs,
+            )
+
+        stat = file.stat()
+        etag = make_etag(course.course_name, stat.st_ino, stat.st_mtime_ns)
+        return conditional_response(
+            "notes_sources",
+            etag,
+            lambda: render_cache.get_or_render(
+                ("sources", str(file), etag), render_listing
+            ),
         )
     if file_path.endswith("/"):
         return redirect(
@@ -127,8 +172,8 @@ def notes_sources(year: str, term: str, course_code: str, file_path: str):
         ".ignore",
         "htmlyes",
     ):
-        return send_file(file, mimetype="text/plain")
-    return send_file(file)
+        return send_precompressed(file, mimetype="text/plain")
+    return send_precompressed(file)
 
 
 @app.route("/notes/<year>/<term>/<course>/<path:html_file>")
@@ -140,34 +185,46 @@ def notes_html(year: str, term: str, course: str, html_file: str):
     file = folder / f"HTML/{html_file}"
     if not file.exists():
         return abort(404)
-    return send_file(file)
+    return send_precompressed(file)
 
 
 @app.route("/notes/<year>/<term>/<course>/HTML/<path:html_file>")
 def notes_html_paginated(year: str, term: str, course: str, html_file: str):
     if not (folder := html_url_to_file_url(year, term, course)):
         return abort(404)
-    file_processed = folder / f"HTML_paginated/{html_file}_processed"
-    if file_processed.exists():
-        with open(file_processed, "rb") as f:
-            data = pickle.load(f)
-            return render_template("notes_paginated.html", course_code=course, **data)
     file = folder / f"HTML_paginated/{html_file}"
     if not file.exists():
         return abort(404)
     if html_file.endswith("css"):
-        replacements = [
-            (r"body {([^}]*)}", ""),
-            (r"@media \(prefers-color-scheme: dark\) {[^}]*}", ""),
-        ]
-        css = f"#pagecontent {{ {file.read_text()} }}"
-        for pattern, replacement in replacements:
-            css = re.sub(pattern, replacement, css)
-        return Response(css, mimetype="text/css")
+        stat = file.stat()
+        return conditional_response(
+            "notes_html_paginated",
+            stat_etag(stat),
+            lambda: Response(scope_stylesheet(file), mimetype="text/css"),
+        )
     if not html_file.endswith("html"):
-        return send_file(file)
-    content = file.read_text()
-    return fix_paginated_html(course, content)
+        return send_precompressed(file)
+    stat = file.stat()
+    return conditional_response(
+        "notes_html_paginated",
+        stat_etag(stat, scoped_stylesheets.course(file.parent).version),
+        lambda: fix_paginated_html(course, file),
+    )
+
+
+@app.route("/notes/<year>/<term>/<course>/HTML/_css/<digest>.css")
+def notes_scoped_css(year: str, term: str, course: str, digest: str):
+    if not (folder := html_url_to_file_url(year, term, course)):
+        return abort(404)
+    stylesheets = scoped_stylesheets.course(folder / "HTML_paginated")
+    if (css := stylesheets.by_digest.get(digest)) is None:
+        return abort(404)
+    response = Response(css, mimetype="text/css")
+    response.set_etag(digest)
+    response.cache_control.public = True
+    response.cache_control.max_age = STYLESHEET_MAX_AGE
+    response.cache_control.immutable = True
+    return response.make_conditional(request)
 
 
 @app.route("/<alias>")
@@ -193,8 +250,29 @@ def flashcards(course_code: str):
 
 @app.route("/notes/")
 def notes_home():
-    term_list = [term for year in get_years() for term in year.get_terms()]
-    return render_template("notes_home.html", terms=term_list)
+    catalog = get_catalog()
+    etag = make_etag(catalog.digest)
+
+    def render_home() -> str:
+        term_list = [
+            term for year in catalog.years for term in catalog.terms.get(year.path, ())
+        ]
+        return render_template("notes_home.html", terms=term_list)
+
+    return conditional_response(
+        "notes_home",
+        etag,
+        lambda: render_cache.get_or_render(("notes_home", etag), render_home),
+    )
+
+
+def search_args(query: str) -> tuple[int, int]:
+    _, limit, offset = search_window(
+        query,
+        request.args.get("limit", SEARCH_PAGE_SIZE, type=int),
+        request.args.get("offset", 0, type=int),
+    )
+    return limit, offset
 
 
 @app.route("/notes/search")
@@ -202,8 +280,69 @@ async def notes_search():
     if not g.search_form.validate():
         return abort(500)
     query = g.search_form.q.data
+    limit, offset = search_args(query)
     return render_template(
-        "notes_search.html", query=query, results=await search_htmls(query)
+        "notes_search.html",
+        query=query,
+        results=await search_htmls(query, limit, offset),
+        limit=limit,
+        offset=offset,
+    )
+
+
+@app.route("/notes/search.json")
+def notes_search_json():
+    if not g.search_form.validate():
+        return {"error": "missing query"}, 400
+    query = g.search_form.q.data
+    limit, offset = search_args(query)
+
+    def generate() -> Iterator[str]:
+        for rank, key, result in iter_search_htmls(query, limit, offset):
+            if isinstance(result, Exception):
+                app.logger.error(
+                    "Failed to load search result %s", key, exc_info=result
+                )
+                yield json.dumps(
+                    {"rank": offset + rank, "key": key, "error": "unavailable"}
+                ) + "\n"
+                continue
+            yield json.dumps(
+                {
+                    "rank": offset + rank,
+                    "key": result.key,
+                    "title": result.title,
+                    "href": result.href,
+                    "highlighted": str(result.highlighted),
+                }
+            ) + "\n"
+
+    return Response(stream_with_context(generate()), mimetype="application/x-ndjson")
+
+
+@app.route("/notes/search/suggest")
+def notes_search_suggest():
+    query = request.args.get("q", "")
+    limit = max(
+        1, min(request.args.get("limit", SUGGEST_LIMIT, type=int), SUGGEST_MAX_LIMIT)
+    )
+    if (suggestions := suggest_index.current()) is None:
+        return {"query": query, "completions": [], "pages": []}
+
+    def render_suggestions() -> dict[str, object]:
+        completions, titles = suggestions.suggest(query, limit)
+        return {
+            "query": query,
+            "completions": completions,
+            "pages": [
+                {"title": title, "href": page_href(key)} for title, key in titles
+            ],
+        }
+
+    return conditional_response(
+        "notes_search_suggest",
+        stat_etag(suggestions.signature),
+        render_suggestions,
     )
 
 
@@ -217,6 +356,21 @@ async def notes_search():
 #     return redirect(url_for("blog_home"))
 
 
+@app.route("/metrics")
+def metrics():
+    authorization = request.authorization
+    if (
+        not METRICS_TOKEN
+        or authorization is None
+        or authorization.type != "bearer"
+        or not secrets.compare_digest(
+            (authorization.token or "").encode(), METRICS_TOKEN.encode()
+        )
+    ):
+        return abort(404)
+    return Response(registry.expose(), mimetype="text/plain; version=0.0.4")
+
+
 @app.route("/")
 def home():
     return render_template("home.html")
@@ -0,0 +1,69 @@
+import argparse
+import random
+import time
+from collections.abc import Callable
+
+from benchmarks.legacy_haystack_highlighter import Highlighter as LegacyHighlighter
+from benchmarks.synthetic import WORDS, synthetic_page
+from haystack_highlighter import Highlighter
+from html_to_txt import html2text
+
+QUERIES = (
+    "group",
+    "subgroup group",
+    "isomorphism kernel image",
+    "normal subgroup quotient coset order",
+    "the a of and is to in that for we",
+)
+
+
+def best_time(function: Callable[[], object], repeat: int, number: int) -> float:
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for _ in range(number):
+            function()
+        timings.append((time.perf_counter() - start) / number)
+    return min(timings)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description="Compare Highlighter against the per-word implementation."
+    )
+    parser.add_argument("--sections", type=int, default=8)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--number", type=int, default=20)
+    args = parser.parse_args()
+
+    text = html2text(synthetic_page(0, args.sections)).replace("\n", " ")
+    rng = random.Random(0)
+    queries = QUERIES + tuple(
+        " ".join(rng.sample(WORDS, rng.randint(1, 6))) for _ in range(20)
+    )
+    mismatches = 0
+    total_legacy = total_new = 0.0
+    print(f"{'query':<40} {'legacy':>10} {'new':>10} {'speedup':>8}")
+    for query in queries:
+        legacy, new = LegacyHighlighter(query), Highlighter(query)
+        if legacy.get_chunks(text) != list(new.get_chunks(text)):
+            mismatches += 1
+            print(f"{query}: snippets differ from the legacy implementation")
+        legacy_time = best_time(lambda: legacy.highlight(text), args.repeat, args.number)
+        new_time = best_time(lambda: new.highlight(text), args.repeat, args.number)
+        total_legacy += legacy_time
+        total_new += new_time
+        print(
+            f"{query[:40]:<40} {legacy_time * 1e6:>8.1f}us {new_time * 1e6:>8.1f}us "
+            f"{legacy_time / new_time:>7.2f}x"
+        )
+    print(
+        f"{len(queries)} queries over {len(text)} characters, {mismatches} mismatches, "
+        f"speedup {total_legacy / total_new:.2f}x"
+    )
+    if mismatches:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
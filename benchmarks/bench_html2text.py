@@ -0,0 +1,107 @@
+import argparse
+import time
+from collections.abc import Callable
+from pathlib import Path
+
+from benchmarks.legacy_html_to_txt import html2text as legacy_html2text
+from benchmarks.synthetic import synthetic_page
+from html_to_txt import html2text
+
+
+def best_time(function: Callable[[str], str], html: str, repeat: int) -> float:
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function(html)
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+EDGE_CASES = {
+    "title with newline": "<title>a\nb</title><p>text</p>",
+    "title with attributes": '<title lang="en">x</title><p>text</p>',
+    "math in script": "<script>var m = '<math>x</math>';</script><p>y</p>",
+    "math in style": "<style>/* <math>x</math> */</style><p>y</p>",
+    "unclosed math": '<p>a <math display="inline"><mi>x</mi></p>',
+    "empty inline math": '<p>a <math display="inline"></math> b</p>',
+    "math with script": '<math display="block"><script>x</script><mi>y</mi></math>',
+    "math with comment": '<math display="inline"><!-- <mi>z</mi> --><mi>y</mi></math>',
+    "math with entities": '<math display="inline"><mo>&lt;</mo><mo>&#x2264;</mo></math>',
+    "math with stray angle": '<math display="inline"><mi>a < b</mi></math>',
+    "charrefs in data": "<p>&amp; &lt; &#x2264; &unknown; &amp</p>",
+    "nested lists": "<ul><li>a<ul><li>b</li></ul></li></ul>",
+    "navigation": '<p>[<a href="a.html">next</a>] [<a href="b.html">up</a>]</p>',
+    "theorem heading": "<p><span>Theorem 1.2 (Name).</span>\nText</p>",
+    "long line": "<p>" + " ".join(["word"] * 60) + "</p>",
+    "list labels": "<dl><dt>(a)</dt><dd>first</dd><dt>(iv)</dt><dd>second</dd></dl>",
+}
+
+
+def load_corpus(base_folder: Path | None) -> dict[str, str]:
+    if base_folder is None:
+        return {
+            f"synthetic, {sections} sections": synthetic_page(sections, sections)
+            for sections in (1, 5, 20, 60)
+        }
+    return {
+        str(path.relative_to(base_folder)): path.read_text()
+        for path in sorted(base_folder.glob("year*/term*/*/HTML_paginated/*.html"))
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description="Compare html2text against the pre-streaming implementation."
+    )
+    parser.add_argument(
+        "--base-folder",
+        type=Path,
+        default=None,
+        help="benchmark the pages of a real notes tree instead of synthetic ones",
+    )
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument(
+        "--check",
+        action="store_true",
+        help="only compare the outputs with the legacy implementation, for CI",
+    )
+    args = parser.parse_args()
+
+    corpus = load_corpus(args.base_folder)
+    mismatches = 0
+    if args.check:
+        corpus.update((f"edge case, {name}", html) for name, html in EDGE_CASES.items())
+        for name, html in corpus.items():
+            if legacy_html2text(html) != html2text(html):
+                mismatches += 1
+                print(f"{name}: output differs from the legacy implementation")
+        print(f"{len(corpus)} pages, {mismatches} mismatches")
+        if mismatches:
+            raise SystemExit(1)
+        return
+    total_legacy = total_new = 0.0
+    print(f"{'page':<40} {'size':>9} {'legacy':>10} {'new':>10} {'speedup':>8}")
+    for name, html in corpus.items():
+        if legacy_html2text(html) != html2text(html):
+            mismatches += 1
+            print(f"{name}: output differs from the legacy implementation")
+        legacy = best_time(legacy_html2text, html, args.repeat)
+        new = best_time(html2text, html, args.repeat)
+        total_legacy += legacy
+        total_new += new
+        if args.base_folder is None or len(corpus) <= 50:
+            print(
+                f"{name[-40:]:<40} {len(html):>9} {legacy * 1000:>8.2f}ms "
+                f"{new * 1000:>8.2f}ms {legacy / new:>7.2f}x"
+            )
+    print(
+        f"{len(corpus)} pages, {mismatches} mismatches, "
+        f"legacy {total_legacy * 1000:.1f}ms, new {total_new * 1000:.1f}ms, "
+        f"speedup {total_legacy / total_new:.2f}x"
+    )
+    if mismatches:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
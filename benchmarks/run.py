@@ -0,0 +1,188 @@
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from collections.abc import Callable
+from pathlib import Path
+
+from benchmarks.synthetic import build_tree
+
+SIZES = {
+    "small": dict(years=1, terms=2, courses=2, pages=4, sections=3, lectures=8),
+    "medium": dict(years=2, terms=2, courses=3, pages=6, sections=4, lectures=12),
+    "large": dict(years=4, terms=3, courses=4, pages=12, sections=6, lectures=24),
+}
+
+
+def measure(function: Callable[[], object], repeat: int, budget: float) -> dict:
+    function()
+    start = time.perf_counter()
+    function()
+    single = time.perf_counter() - start
+    number = max(1, int(budget / repeat / max(single, 1e-7)))
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for _ in range(number):
+            function()
+        timings.append((time.perf_counter() - start) / number)
+    return {
+        "best": min(timings),
+        "median": statistics.median(timings),
+        "number": number,
+        "repeat": repeat,
+    }
+
+
+def git_revision() -> str | None:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True,
+            check=True,
+            text=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def collect(course_folders: list[Path]) -> dict[str, Callable[[], object]]:
+    from app import app
+    from generate_webpage import (
+        Catalog,
+        get_catalog,
+        get_course_from_alias,
+        get_course_from_course_code,
+        get_courses,
+        tree_signature,
+    )
+    from haystack_highlighter import Highlighter
+    from html_fixing import fix_paginated_html, render_cache
+    from html_to_txt import html2text
+    from scoped_css import scoped_stylesheets, stylesheet_url
+    from source_items import list_directory, scan_directory
+
+    app.config["TESTING"] = True
+    client = app.test_client()
+
+    course = get_courses()[0]
+    pages = sorted((course.path / "HTML_paginated").glob("*se*.html"))
+    page = pages[len(pages) // 2]
+    html = page.read_text()
+    text = html2text(html)
+    highlighter = Highlighter("group isomorphism kernel")
+    sources_folder = course_folders[-1]
+    aliases = list(get_catalog().by_alias)
+    digest = next(iter(scoped_stylesheets.course(page.parent).by_digest))
+
+    def fix_paginated_html_cold() -> None:
+        render_cache.clear()
+        with app.test_request_context():
+            app.preprocess_request()
+            fix_paginated_html(course.course_code, page)
+
+    def fix_paginated_html_warm() -> None:
+        with app.test_request_context():
+            app.preprocess_request()
+            fix_paginated_html(course.course_code, page)
+
+    def lookups() -> None:
+        for alias in aliases:
+            get_course_from_alias(alias)
+            get_course_from_course_code(alias)
+
+    routes = {
+        "notes_home": "/notes/",
+        "notes_html_paginated": course.html_url(),
+        "notes_html_paginated_page": f"{course.url()}/HTML/{page.name}",
+        "notes_html_paginated_css": f"{course.url()}/HTML/{course.course_code}.css",
+        "notes_scoped_css": f"{course.url()}/HTML/{stylesheet_url(digest)}",
+        "notes_sources": course.sources_url(),
+        "notes_pdf": course.pdf_url(),
+        "course_redirect": f"/{aliases[0]}",
+    }
+    for name, url in routes.items():
+        if (status := client.get(url).status_code) not in (200, 301):
+            raise SystemExit(f"{name}: GET {url} returned {status}")
+
+    def route(url: str) -> Callable[[], object]:
+        return lambda: client.get(url).close()
+
+    return {
+        "html2text": lambda: html2text(html),
+        "highlighter": lambda: highlighter.highlight(text),
+        "fix_paginated_html_cold": fix_paginated_html_cold,
+        "fix_paginated_html_warm": fix_paginated_html_warm,
+        "source_items_scan": lambda: scan_directory(sources_folder),
+        "source_items_cached": lambda: list_directory(sources_folder),
+        "catalog_build": lambda: Catalog.build(tree_signature()),
+        "get_catalog": get_catalog,
+        "get_courses": get_courses,
+        "course_lookups": lookups,
+        **{f"route_{name}": route(url) for name, url in routes.items()},
+    }
+
+
+def compare(results: dict, baseline_path: Path) -> None:
+    baseline = json.loads(baseline_path.read_text())["benchmarks"]
+    print(f"\ncompared with {baseline_path}")
+    for name, result in results.items():
+        if name not in baseline:
+            continue
+        ratio = baseline[name]["best"] / result["best"]
+        print(f"{name:<40} {ratio:>6.2f}x {'faster' if ratio >= 1 else 'slower'}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description="Time the hot paths of the site against a synthetic notes tree."
+    )
+    parser.add_argument("--size", choices=SIZES, default="medium")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument(
+        "--budget", type=float, default=1.0, help="seconds to spend per benchmark"
+    )
+    parser.add_argument("--filter", default="", help="only run matching benchmarks")
+    parser.add_argument("--output", type=Path, help="write the results as JSON")
+    parser.add_argument("--compare", type=Path, help="JSON results to compare with")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory(prefix="notes-bench-") as root:
+        course_folders = build_tree(Path(root), **SIZES[args.size])
+        os.environ["NOTES_BASE_FOLDER"] = root
+        os.environ["TEXT_STORE_PATH"] = str(Path(root) / ".search_text.sqlite3")
+        results = {}
+        for name, function in collect(course_folders).items():
+            if args.filter not in name:
+                continue
+            results[name] = measure(function, args.repeat, args.budget)
+            print(
+                f"{name:<40} {results[name]['best'] * 1e6:>12.1f}us "
+                f"(median {results[name]['median'] * 1e6:.1f}us)"
+            )
+
+    if args.output:
+        args.output.write_text(
+            json.dumps(
+                {
+                    "revision": git_revision(),
+                    "python": sys.version.split()[0],
+                    "platform": platform.platform(),
+                    "size": args.size,
+                    "benchmarks": results,
+                },
+                indent=2,
+            )
+            + "\n"
+        )
+    if args.compare:
+        compare(results, args.compare)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,250 @@
+import random
+from pathlib import Path
+
+WORDS = (
+    "group subgroup isomorphism homomorphism kernel image quotient normal coset "
+    "order element identity inverse ring field ideal module vector space basis "
+    "dimension linear map matrix eigenvalue eigenvector determinant trace "
+    "continuous compact open closed set function sequence converges limit "
+    "the a of and is to in that for we let then if by with be this as are it"
+).split()
+
+THEOREM_KINDS = ("Theorem", "Lemma", "Proposition", "Corollary", "Definition")
+
+
+def sentence(rng: random.Random, length: int) -> str:
+    return " ".join(rng.choice(WORDS) for _ in range(length))
+
+
+def inline_math(rng: random.Random) -> str:
+    a, b = rng.sample("GHKNxyzgh", 2)
+    return (
+        '<!-- l. 12 --><math xmlns="http://www.w3.org/1998/Math/MathML" '
+        f'display="inline"><mrow><mi>{a}</mi><mo>&#x2264;</mo>'
+        f"<mi>{b}</mi><mo>\u2061</mo><mo>(</mo><mi>x</mi><mo>)</mo></mrow></math>"
+    )
+
+
+def display_math(rng: random.Random) -> str:
+    a, b = rng.sample("GHKNxyzgh", 2)
+    return (
+        '<table class="equation"><tr><td>\n'
+        '<math xmlns="http://www.w3.org/1998/Math/MathML" display="block" '
+        f'class="equation"><mrow>\n<mo>|</mo><mi>{a}</mi><mo>|</mo>\n<mo>=</mo>\n'
+        f"<mo>|</mo><mi>{b}</mi><mo>|</mo><mo>&#x22C5;</mo>\n"
+        f'<mo>|</mo><mi>{a}</mi><mo>:</mo><mi>{b}</mi><mo>|</mo><mo class="MathClass-punc">.</mo>\n'
+        "</mrow></math></td><td class=\"eq-no\">(1.1)</td></tr></table>\n"
+    )
+
+
+def paragraph(rng: random.Random) -> str:
+    pieces = []
+    for _ in range(rng.randint(2, 6)):
+        pieces.append(sentence(rng, rng.randint(4, 14)))
+        if rng.random() < 0.6:
+            pieces.append(inline_math(rng))
+    text = "\n".join(pieces)
+    return f'<!-- l. 20 --><p class="indent" >   {text}.\n</p>\n'
+
+
+def theorem(rng: random.Random, number: str) -> str:
+    kind = rng.choice(THEOREM_KINDS)
+    return (
+        f'<div class="newtheorem">\n<!-- l. 30 --><p class="noindent" >'
+        f'<span class="head">\n<a id="x1-2001r{number}"></a>\n\n'
+        f'<span class="ec-lmbx-12">{kind} {number}</span>\n'
+        f"(<span class=\"ec-lmbx-12\">{sentence(rng, 2)}</span>)<span class=\"ec-lmbx-12\">.</span>\n"
+        f"</span>{sentence(rng, 12)}\n{inline_math(rng)}\n{sentence(rng, 8)}.\n</p>\n"
+        "</div>\n"
+    )
+
+
+def proof(rng: random.Random) -> str:
+    return (
+        '<div class="proof">\n<!-- l. 40 --><p class="indent" >'
+        '   <span class="head">\n<span class="ec-lmri-12">Proof.</span>\n</span>'
+        f"{sentence(rng, 15)}\n{display_math(rng)}{sentence(rng, 10)}.\n</p></div>\n"
+    )
+
+
+def enumerate_list(rng: random.Random) -> str:
+    items = "".join(
+        f'<dt class="enumerate-enumitem">({label})</dt><dd class="enumerate-enumitem">'
+        f"{sentence(rng, 9)} {inline_math(rng)}\n</dd>"
+        for label in "abc"[: rng.randint(2, 3)]
+    )
+    return f'<dl class="enumerate-enumitem">{items}\n</dl>\n'
+
+
+def itemize_list(rng: random.Random) -> str:
+    items = "".join(
+        f'<li class="itemize">{sentence(rng, 7)}\n</li>\n' for _ in range(3)
+    )
+    return f'<ul class="itemize1">\n{items}</ul>\n'
+
+
+def crosslinks(previous: str | None, next: str | None, up: str) -> str:
+    links = []
+    if next:
+        links.append(f'[<a href="{next}">next</a>]')
+    if previous:
+        links.append(f'[<a href="{previous}">prev</a>]')
+    links.append(f'[<a href="{up}#tail{up}">prev-tail</a>]')
+    links.append(f'[<a href="{up}">up</a>]')
+    return f'<div class="crosslinks"><p class="noindent">{" ".join(links)}</p></div>\n'
+
+
+def synthetic_page(
+    seed: int,
+    sections: int,
+    title: str = "Groups",
+    css: str = "groups.css",
+    previous: str | None = None,
+    next: str | None = None,
+    up: str = "groups.html",
+) -> str:
+    rng = random.Random(seed)
+    blocks = []
+    for section in range(1, sections + 1):
+        blocks.append(
+            f'<h3 class="sectionHead"><span class="titlemark">{section}</span>'
+            f' <a id="x1-{section}000"></a>{sentence(rng, 3).title()}</h3>\n'
+        )
+        for number in range(1, 4):
+            blocks.append(paragraph(rng))
+            blocks.append(theorem(rng, f"{section}.{number}"))
+            blocks.append(proof(rng))
+            blocks.append(rng.choice((enumerate_list, itemize_list))(rng))
+        blocks.append('<!-- l. 50 --><p class="noindent" >˙\n</p>\n')
+    navigation = crosslinks(previous, next, up)
+    return (
+        '<!DOCTYPE html>\n<html lang="en-US" xml:lang="en-US" >\n<head>'
+        f"<title>{sentence(rng, 2).title()} - {title}</title>\n"
+        '<meta charset="utf-8" />\n'
+        '<meta name="generator" content="TeX4ht (https://tug.org/tex4ht/)" />\n'
+        f'<link rel="stylesheet" type="text/css" href="{css}" />\n'
+        '<script type="text/javascript" src="mathjax.js"></script>\n'
+        "<style>.x{}</style>\n</head><body>\n"
+        f"{navigation}{''.join(blocks)}{navigation}</body></html>\n"
+    )
+
+
+TERM_NAMES = ("Michaelmas", "Lent", "Easter")
+
+PART_NAMES = ("IA", "IB", "II", "III")
+
+COURSE_NAMES = (
+    "Groups",
+    "Vectors and Matrices",
+    "Numbers and Sets",
+    "Analysis I",
+    "Linear Algebra",
+    "Rings and Modules",
+    "Complex Analysis",
+    "Markov Chains",
+    "Metric and Topological Spaces",
+)
+
+STYLESHEET = """
+/* start css.sty */
+.ec-lmbx-12{ font-weight: bold;}
+.ec-lmri-12{ font-style: italic;}
+body { margin: 1em; font-family: serif; }
+p.noindent { text-indent: 0em }
+p.indent { text-indent: 1.5em }
+div.newtheorem { margin-bottom: 2em; margin-top: 2em;}
+.equation td{text-align:center; }
+dl.enumerate-enumitem{ margin-top:0.5em; }
+@media (prefers-color-scheme: dark) { body { background: #000; color: #fff; } }
+.crosslinks {margin:0.5em; padding: 0.5em;}
+/* end css.sty */
+"""
+
+
+def lecture_source(rng: random.Random, number: int) -> str:
+    lines = [f"\\section{{Lecture {number}}}"]
+    for _ in range(40):
+        lines.append(sentence(rng, rng.randint(6, 16)) + f" ${rng.choice('GHKN')}$.")
+    return "\n".join(lines) + "\n"
+
+
+def build_course(
+    course_folder: Path,
+    seed: int,
+    title: str,
+    pages: int,
+    sections: int,
+    lectures: int,
+) -> None:
+    rng = random.Random(seed)
+    code = course_folder.name
+    course_folder.mkdir(parents=True)
+    (course_folder / "title.txt").write_text(f"{title}\n")
+    (course_folder / "aliases.txt").write_text(
+        "\n".join(
+            dict.fromkeys(("".join(word[0] for word in title.split()), title.split()[0]))
+        )
+        + "\n"
+    )
+    (course_folder / f"{code}.pdf").write_bytes(b"%PDF-1.5\n%%EOF\n")
+    (course_folder / "main.tex").write_text(
+        "\\documentclass{article}\n\\begin{document}\n"
+        + "".join(f"\\input{{lecture{i}}}\n" for i in range(1, lectures + 1))
+        + "\\end{document}\n"
+    )
+    (course_folder / "preamble.4ht").write_text("\\Preamble{xhtml}\n\\EndPreamble\n")
+    for extension in (".aux", ".log", ".toc", ".fls"):
+        (course_folder / f"main{extension}").write_text("generated\n")
+    for i in range(1, lectures + 1):
+        (course_folder / f"lecture{i}.tex").write_text(lecture_source(rng, i))
+    figures = course_folder / "figures"
+    figures.mkdir()
+    for i in range(1, lectures + 1):
+        (figures / f"figure{i}.png").write_bytes(b"\x89PNG\r\n\x1a\n" + bytes(64))
+
+    html = course_folder / "HTML_paginated"
+    html.mkdir()
+    (html / f"{code}.css").write_text(STYLESHEET)
+    names = [f"{code}.html"] + [f"{code}se{i}.html" for i in range(1, pages)]
+    for i, name in enumerate(names):
+        (html / name).write_text(
+            synthetic_page(
+                seed * 1000 + i,
+                sections,
+                title=title,
+                css=f"{code}.css",
+                previous=names[i - 1] if i > 0 else None,
+                next=names[i + 1] if i + 1 < len(names) else None,
+                up=names[0],
+            )
+        )
+    (html / "figure1.svg").write_text('<svg xmlns="http://www.w3.org/2000/svg"/>\n')
+
+
+def build_tree(
+    root: Path,
+    years: int = 2,
+    terms: int = 2,
+    courses: int = 3,
+    pages: int = 6,
+    sections: int = 4,
+    lectures: int = 12,
+) -> list[Path]:
+    course_folders = []
+    for year in range(1, years + 1):
+        year_folder = root / f"year{year}"
+        year_folder.mkdir(parents=True)
+        (year_folder / "title.txt").write_text(f"{PART_NAMES[year - 1]}\n")
+        for term in range(1, terms + 1):
+            term_folder = year_folder / f"term{term}"
+            term_folder.mkdir()
+            (term_folder / "title.txt").write_text(f"{TERM_NAMES[term - 1]}\n")
+            for course in range(courses):
+                seed = len(course_folders)
+                title = COURSE_NAMES[seed % len(COURSE_NAMES)]
+                code = title.split()[0].lower() + f"{year}{term}{course}"
+                build_course(
+                    term_folder / code, seed, title, pages, sections, lectures
+                )
+                course_folders.append(term_folder / code)
+    return course_folders
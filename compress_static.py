@@ -0,0 +1,123 @@
+import argparse
+import gzip
+import os
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+
+import brotli
+
+from generate_webpage import get_courses
+from precompressed import (
+    COMPRESSIBLE_EXTENSIONS,
+    ENCODINGS,
+    compressed_path,
+    is_rendered,
+)
+
+MIN_SIZE = int(os.environ.get("PRECOMPRESS_MIN_SIZE", 1024))
+
+
+def compress(data: bytes, encoding: str) -> bytes:
+    if encoding == "br":
+        return brotli.compress(data, quality=11)
+    return gzip.compress(data, compresslevel=9, mtime=0)
+
+
+def is_up_to_date(file: Path, suffix: str) -> bool:
+    try:
+        return (
+            compressed_path(file, suffix).stat().st_mtime_ns == file.stat().st_mtime_ns
+        )
+    except FileNotFoundError:
+        return False
+
+
+def compress_file(file: Path, encodings: list[tuple[str, str]]) -> tuple[int, int]:
+    source_stat = file.stat()
+    data = file.read_bytes()
+    smallest = len(data)
+    for encoding, suffix in encodings:
+        output = compressed_path(file, suffix)
+        compressed = compress(data, encoding)
+        if len(compressed) >= len(data):
+            output.unlink(missing_ok=True)
+            continue
+        smallest = min(smallest, len(compressed))
+        with tempfile.NamedTemporaryFile(
+            dir=output.parent, prefix=f".{output.name}.", delete=False
+        ) as f:
+            try:
+                f.write(compressed)
+            except BaseException:
+                os.unlink(f.name)
+                raise
+        os.utime(f.name, ns=(source_stat.st_atime_ns, source_stat.st_mtime_ns))
+        os.replace(f.name, output)
+    return len(data), smallest
+
+
+def find_files(encodings: list[tuple[str, str]], force: bool) -> tuple[list[Path], int]:
+    files = []
+    skipped = 0
+    for course in get_courses():
+        for root, folders, names in os.walk(course.path):
+            folders[:] = [folder for folder in folders if folder != "result"]
+            for name in names:
+                file = Path(root) / name
+                if file.suffix not in COMPRESSIBLE_EXTENSIONS:
+                    continue
+                if is_rendered(file):
+                    for _, suffix in ENCODINGS:
+                        compressed_path(file, suffix).unlink(missing_ok=True)
+                    continue
+                if file.stat().st_size < MIN_SIZE:
+                    continue
+                if not force and all(
+                    is_up_to_date(file, suffix) for _, suffix in encodings
+                ):
+                    skipped += 1
+                    continue
+                files.append(file)
+    return files, skipped
+
+
+def compress_all(jobs: int | None, force: bool) -> None:
+    start = time.perf_counter()
+    encodings = list(ENCODINGS)
+    files, skipped = find_files(encodings, force)
+    original_bytes = compressed_bytes = failed = 0
+    with ProcessPoolExecutor(max_workers=jobs) as executor:
+        futures = {
+            executor.submit(compress_file, file, encodings): file for file in files
+        }
+        for future in as_completed(futures):
+            try:
+                original, compressed = future.result()
+            except Exception as e:
+                failed += 1
+                print(f"  failed  {futures[future]}: {e!r}")
+                continue
+            original_bytes += original
+            compressed_bytes += compressed
+    print(
+        f"Compressed {len(files) - failed} files "
+        f"({original_bytes / 1024:.0f} KiB -> {compressed_bytes / 1024:.0f} KiB), "
+        f"skipped {skipped} unchanged, {failed} failed "
+        f"in {time.perf_counter() - start:.1f}s"
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Write .gz and .br siblings of compressible notes files."
+    )
+    parser.add_argument(
+        "-j", "--jobs", type=int, default=None, help="number of worker processes"
+    )
+    parser.add_argument(
+        "-f", "--force", action="store_true", help="recompress unchanged files too"
+    )
+    args = parser.parse_args()
+    compress_all(args.jobs, args.force)
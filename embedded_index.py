@@ -0,0 +1,247 @@
+import bisect
+import heapq
+import math
+import mmap
+import os
+import re
+import struct
+import tempfile
+import threading
+from array import array
+from collections import Counter
+from collections.abc import Iterable
+from pathlib import Path
+
+from generate_webpage import BASE_FOLDER
+
+SEARCH_BACKENDS = ("sonic", "embedded")
+SEARCH_BACKEND = os.environ.get("SEARCH_BACKEND", "sonic")
+if SEARCH_BACKEND not in SEARCH_BACKENDS:
+    raise ValueError(
+        f"SEARCH_BACKEND must be one of {', '.join(SEARCH_BACKENDS)}, "
+        f"not {SEARCH_BACKEND!r}"
+    )
+EMBEDDED_INDEX_PATH = Path(
+    os.environ.get("EMBEDDED_INDEX_PATH", BASE_FOLDER / ".search_index.bin")
+)
+PREFIX_EXPANSIONS = int(os.environ.get("EMBEDDED_INDEX_PREFIX_EXPANSIONS", 32))
+PREFIX_WEIGHT = 0.5
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+MAGIC = b"NOTESIX1"
+SECTIONS = (
+    "key_offsets",
+    "keys",
+    "lengths",
+    "term_offsets",
+    "terms",
+    "posting_offsets",
+    "posting_documents",
+    "posting_frequencies",
+)
+HEADER = struct.Struct("<8sIId" + "QQ" * len(SECTIONS))
+
+TOKEN = re.compile(r"[a-z0-9]+")
+
+
+def tokenize(text: str) -> list[str]:
+    return TOKEN.findall(text.lower())
+
+
+def offsets(items: Iterable[bytes], blob: bytearray) -> array:
+    table = array("I", [0])
+    for item in items:
+        blob += item
+        table.append(len(blob))
+    return table
+
+
+def write_index(pages: Iterable[tuple[str, str]], path: Path) -> tuple[int, int]:
+    keys: list[bytes] = []
+    lengths = array("I")
+    postings: dict[str, tuple[array, array]] = {}
+    for document, (key, text) in enumerate(pages):
+        counts = Counter(tokenize(text))
+        keys.append(key.encode())
+        lengths.append(sum(counts.values()))
+        for term, frequency in counts.items():
+            if (posting := postings.get(term)) is None:
+                posting = postings[term] = (array("I"), array("I"))
+            posting[0].append(document)
+            posting[1].append(frequency)
+
+    terms = sorted(postings)
+    key_blob, term_blob = bytearray(), bytearray()
+    posting_documents, posting_frequencies = array("I"), array("I")
+    posting_offsets = array("I", [0])
+    for term in terms:
+        documents, frequencies = postings[term]
+        posting_documents.extend(documents)
+        posting_frequencies.extend(frequencies)
+        posting_offsets.append(len(posting_documents))
+    sections = {
+        "key_offsets": offsets(keys, key_blob).tobytes(),
+        "keys": bytes(key_blob),
+        "lengths": lengths.tobytes(),
+        "term_offsets": offsets((term.encode() for term in terms), term_blob).tobytes(),
+        "terms": bytes(term_blob),
+        "posting_offsets": posting_offsets.tobytes(),
+        "posting_documents": posting_documents.tobytes(),
+        "posting_frequencies": posting_frequencies.tobytes(),
+    }
+
+    layout = []
+    position = HEADER.size
+    for name in SECTIONS:
+        position += -position % 8
+        layout += [position, len(sections[name])]
+        position += len(sections[name])
+    average_length = sum(lengths) / len(lengths) if sum(lengths) else 1.0
+    header = HEADER.pack(MAGIC, len(keys), len(terms), average_length, *layout)
+
+    with tempfile.NamedTemporaryFile(
+        dir=path.parent, prefix=f".{path.name}.", delete=False
+    ) as f:
+        try:
+            f.write(header)
+            for name, start in zip(SECTIONS, layout[::2]):
+                f.write(bytes(start - f.tell()))
+                f.write(sections[name])
+            f.flush()
+            os.fsync(f.fileno())
+        except BaseException:
+            os.unlink(f.name)
+            raise
+    os.replace(f.name, path)
+    return len(keys), len(terms)
+
+
+class Terms:
+    def __init__(self, offsets: memoryview, blob: memoryview) -> None:
+        self.offsets = offsets
+        self.blob = blob
+
+    def __len__(self) -> int:
+        return len(self.offsets) - 1
+
+    def __getitem__(self, i: int) -> bytes:
+        return self.blob[self.offsets[i] : self.offsets[i + 1]].tobytes()
+
+
+class IndexFile:
+    def __init__(self, path: Path) -> None:
+        with open(path, "rb") as f:
+            self.signature = os.fstat(f.fileno())
+            self.map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, self.documents, _, self.average_length, *layout = (
+            HEADER.unpack_from(self.map)
+        )
+        if magic != MAGIC:
+            raise ValueError(f"{path} is not a search index")
+        self.average_length = self.average_length or 1.0
+        view = memoryview(self.map)
+        sections = {
+            name: view[start : start + length]
+            for name, start, length in zip(SECTIONS, layout[::2], layout[1::2])
+        }
+        self.key_offsets = sections["key_offsets"].cast("I")
+        self.keys = sections["keys"]
+        self.lengths = sections["lengths"].cast("I")
+        self.terms = Terms(sections["term_offsets"].cast("I"), sections["terms"])
+        self.posting_offsets = sections["posting_offsets"].cast("I")
+        self.posting_documents = sections["posting_documents"].cast("I")
+        self.posting_frequencies = sections["posting_frequencies"].cast("I")
+
+    def key(self, document: int) -> str:
+        start, end = self.key_offsets[document], self.key_offsets[document + 1]
+        return self.keys[start:end].tobytes().decode()
+
+    def expand(self, word: str) -> list[tuple[int, float]]:
+        prefix = word.encode()
+        first = bisect.bisect_left(self.terms, prefix)
+        matches = []
+        for term_id in range(first, min(len(self.terms), first + PREFIX_EXPANSIONS)):
+            if not (term := self.terms[term_id]).startswith(prefix):
+                break
+            matches.append((term_id, 1.0 if term == prefix else PREFIX_WEIGHT))
+        return matches
+
+    def score(self, word: str) -> dict[int, float]:
+        scores: dict[int, float] = {}
+        for term_id, weight in self.expand(word):
+            start = self.posting_offsets[term_id]
+            end = self.posting_offsets[term_id + 1]
+            idf = math.log(
+                1 + (self.documents - (end - start) + 0.5) / (end - start + 0.5)
+            )
+            for document, frequency in zip(
+                self.posting_documents[start:end], self.posting_frequencies[start:end]
+            ):
+                norm = (
+                    1 - BM25_B + BM25_B * self.lengths[document] / self.average_length
+                )
+                score = (
+                    weight
+                    * idf
+                    * frequency
+                    * (BM25_K1 + 1)
+                    / (frequency + BM25_K1 * norm)
+                )
+                if score > scores.get(document, 0.0):
+                    scores[document] = score
+        return scores
+
+    def search(self, query: str, limit: int, offset: int) -> list[str]:
+        words = list(dict.fromkeys(tokenize(query)))
+        if not words or not self.documents:
+            return []
+        scores: dict[int, float] | None = None
+        for word in words:
+            word_scores = self.score(word)
+            if scores is None:
+                scores = word_scores
+            else:
+                scores = {
+                    document: score + word_scores[document]
+                    for document, score in scores.items()
+                    if document in word_scores
+                }
+            if not scores:
+                return []
+        assert scores is not None
+        ranked = heapq.nlargest(
+            offset + limit, scores.items(), key=lambda item: (item[1], -item[0])
+        )
+        return [self.key(document) for document, _ in ranked[offset:]]
+
+
+class EmbeddedIndex:
+    def __init__(self, path: Path) -> None:
+        self.path = path
+        self._file: IndexFile | None = None
+        self._lock = threading.Lock()
+
+    def current(self) -> IndexFile | None:
+        try:
+            stat = self.path.stat()
+        except FileNotFoundError:
+            return None
+        index = self._file
+        if index is not None and (
+            (index.signature.st_ino, index.signature.st_mtime_ns)
+            == (stat.st_ino, stat.st_mtime_ns)
+        ):
+            return index
+        with self._lock:
+            if self._file is index:
+                self._file = IndexFile(self.path)
+            return self._file
+
+    def search(self, query: str, limit: int, offset: int) -> list[str]:
+        if (index := self.current()) is None:
+            return []
+        return index.search(query, limit, offset)
+
+
+embedded_index = EmbeddedIndex(EMBEDDED_INDEX_PATH)
@@ -0,0 +1,166 @@
+import argparse
+import os
+import tempfile
+import time
+from collections.abc import Iterator
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+from flask.testing import FlaskClient
+
+from app import app
+from generate_webpage import Course, get_catalog, get_courses
+from page_bundle import BUNDLE_NAME
+from precompressed import ENCODINGS
+from scoped_css import scoped_stylesheets, stylesheet_url
+from source_items import is_hidden
+
+client: FlaskClient | None = None
+
+
+def start_worker() -> None:
+    global client
+    app.config["TESTING"] = True
+    client = app.test_client()
+
+
+def source_urls(folder: Path, url: str) -> Iterator[str]:
+    yield url
+    for path in sorted(folder.iterdir()):
+        if is_hidden(path.name):
+            continue
+        if path.is_dir():
+            yield from source_urls(path, f"{url}{path.name}/")
+        else:
+            yield f"{url}{path.name}"
+
+
+COMPRESSED_SUFFIXES = tuple(suffix for _, suffix in ENCODINGS)
+
+
+def course_urls(course: Course) -> Iterator[str]:
+    url = course.url()
+    for pdf in sorted(course.path.glob("*.pdf")):
+        yield f"{url}/{pdf.name}"
+    if (html := course.path / "HTML").is_dir():
+        for path in sorted(html.rglob("*")):
+            if path.is_file() and not path.name.endswith(
+                ("_processed", *COMPRESSED_SUFFIXES)
+            ):
+                yield f"{url}/{path.relative_to(html).as_posix()}"
+        if (html / f"{course.course_code}_final.html").exists():
+            yield f"{url}/{course.course_code}.html"
+    if (paginated := course.path / "HTML_paginated").is_dir():
+        for path in sorted(paginated.iterdir()):
+            if (
+                path.is_file()
+                and path.name != BUNDLE_NAME
+                and not path.name.endswith(COMPRESSED_SUFFIXES)
+            ):
+                yield f"{url}/HTML/{path.name}"
+        for digest in scoped_stylesheets.course(paginated).by_digest:
+            yield f"{url}/HTML/{stylesheet_url(digest)}"
+    if course.flashcards_exist:
+        yield course.flashcards_url()
+    yield from source_urls(course.path, course.sources_url())
+
+
+def all_urls() -> Iterator[str]:
+    yield "/"
+    yield "/notes/"
+    for course in get_courses():
+        yield from course_urls(course)
+    for alias in get_catalog().by_alias:
+        yield f"/{alias}"
+        yield f"/{alias}.html"
+
+
+def output_path(output: Path, url: str) -> Path:
+    path = url.lstrip("/")
+    if path == "" or path.endswith("/"):
+        path += "index.html"
+    return output / path
+
+
+def freeze_url(output: Path, url: str) -> tuple[str, int | None, str | None]:
+    assert client is not None
+    try:
+        response = client.get(url)
+    except Exception as e:
+        return url, None, repr(e)
+    try:
+        if response.status_code in (301, 302, 307, 308):
+            return url, response.status_code, response.location
+        if response.status_code != 200:
+            return url, response.status_code, None
+        path = output_path(output, url)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with tempfile.NamedTemporaryFile(
+            dir=path.parent, prefix=f".{path.name}.", delete=False
+        ) as f:
+            try:
+                f.write(response.get_data())
+            except BaseException:
+                os.unlink(f.name)
+                raise
+        os.replace(f.name, path)
+        return url, response.status_code, None
+    except Exception as e:
+        return url, None, repr(e)
+    finally:
+        response.close()
+
+
+def without_collisions(output: Path, urls: list[str]) -> tuple[list[str], int]:
+    by_path: dict[Path, str] = {}
+    collisions = 0
+    for url in urls:
+        path = output_path(output, url)
+        if (other := by_path.setdefault(path, url)) != url:
+            collisions += 1
+            print(f"skipped {url}: {path} is already written by {other}")
+    return list(by_path.values()), collisions
+
+
+def freeze(output: Path, jobs: int | None) -> None:
+    start = time.perf_counter()
+    urls, failed = without_collisions(output, list(dict.fromkeys(all_urls())))
+    output.mkdir(parents=True, exist_ok=True)
+    redirects = []
+    written = 0
+    with ProcessPoolExecutor(max_workers=jobs, initializer=start_worker) as executor:
+        for url, status, detail in executor.map(
+            freeze_url, [output] * len(urls), urls, chunksize=16
+        ):
+            if status is None:
+                failed += 1
+                print(f"error {url}: {detail}")
+            elif detail is not None:
+                redirects.append((url, detail))
+            elif status == 200:
+                written += 1
+            else:
+                failed += 1
+                print(f"{status} {url}")
+    start_worker()
+    assert client is not None
+    (output / "404.html").write_bytes(client.get("/notes/missing/").get_data())
+    (output / "redirects.map").write_text(
+        "".join(f"{url} {location};\n" for url, location in sorted(redirects))
+    )
+    print(
+        f"Froze {written} pages and {len(redirects)} redirects into {output}, "
+        f"{failed} failed in {time.perf_counter() - start:.1f}s"
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Render every notes page into a static tree for nginx or a CDN."
+    )
+    parser.add_argument("output", type=Path)
+    parser.add_argument(
+        "-j", "--jobs", type=int, default=None, help="worker processes (default: CPUs)"
+    )
+    args = parser.parse_args()
+    freeze(args.output, args.jobs)
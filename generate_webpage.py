@@ -1,10 +1,16 @@
 from __future__ import annotations
 
 import functools
+import hashlib
+import os
+import threading
+import time
 from dataclasses import dataclass
 from pathlib import Path
 
-BASE_FOLDER = Path("/base_folder")
+BASE_FOLDER = Path(os.environ.get("NOTES_BASE_FOLDER", "/base_folder"))
+
+CATALOG_CHECK_INTERVAL = float(os.environ.get("CATALOG_CHECK_INTERVAL", "2"))
 
 
 @dataclass
@@ -14,18 +20,37 @@ class Part:
 
     @property
     def part_name(self) -> str:
-        with open(self.path / "title.txt") as f:
-            return f.read().strip()
+        if (title := get_catalog().titles.get(self.path)) is not None:
+            return title
+        return read_title(self.path)
 
     def get_terms(self) -> list[Term]:
-        return sorted(
-            (Term(i) for i in self.path.glob("term*")), key=lambda term: term.path.name
-        )
+        if (terms := get_catalog().terms.get(self.path)) is not None:
+            return list(terms)
+        return scan_terms(self.path)
 
     def __le__(self, other: Part) -> bool:
         return self.path.name <= other.path.name
 
 
+@dataclass(frozen=True)
+class CourseFlags:
+    course_pdf_exists: bool
+    notes_exist: bool
+    flashcards_exist: bool
+    html_exists: bool
+
+    @classmethod
+    def from_path(cls, path: Path) -> CourseFlags:
+        course_pdf_exists = (path / f"{path.name}.pdf").exists()
+        return cls(
+            course_pdf_exists=course_pdf_exists,
+            notes_exist=course_pdf_exists or (path / "lecture1.pdf").exists(),
+            flashcards_exist=(BASE_FOLDER / f"{path.name}.apkg").exists(),
+            html_exists=(path / "HTML_paginated").exists(),
+        )
+
+
 @dataclass
 @functools.total_ordering
 class Course:
@@ -33,8 +58,9 @@ class Course:
 
     @property
     def course_name(self) -> str:
-        with open(self.path / "title.txt") as f:
-            return f.read().strip()
+        if (title := get_catalog().titles.get(self.path)) is not None:
+            return title
+        return read_title(self.path)
 
     @property
     def course_code(self) -> str:
@@ -48,25 +74,29 @@ class Course:
     def part(self) -> Part:
         return self.term.part
 
+    @property
+    def flags(self) -> CourseFlags:
+        if (flags := get_catalog().flags.get(self.path)) is not None:
+            return flags
+        return CourseFlags.from_path(self.path)
+
     @property
     def notes_exist(self) -> bool:
-        return (self.path / f"{self.path.name}.pdf").exists() or (
-            self.path / "lecture1.pdf"
-        ).exists()
+        return self.flags.notes_exist
 
     @property
     def flashcards_exist(self) -> bool:
-        return (BASE_FOLDER / f"{self.path.name}.apkg").exists()
+        return self.flags.flashcards_exist
 
     @property
     def html_exists(self) -> bool:
-        return (self.path / "HTML_paginated").exists()
+        return self.flags.html_exists
 
     def url(self) -> str:
         return f"/notes/{self.part.part_name}/{self.term.term_name}/{self.course_code}"
 
     def pdf_url(self) -> str:
-        if not (self.path / f"{self.path.name}.pdf").exists():
+        if not self.flags.course_pdf_exists:
             return f"{self.url()}/lecture1.pdf"
         return f"{self.url()}/{self.course_code}.pdf"
 
@@ -74,7 +104,7 @@ class Course:
         return f"/notes/{self.course_code}.apkg"
 
     def html_url(self) -> str:
-        if (self.path / "HTML_paginated").exists():
+        if self.flags.html_exists:
             return f"{self.url()}/HTML/{self.course_code}.html"
         return f"{self.url()}/{self.course_code}.html"
 
@@ -108,8 +138,9 @@ class Term:
 
     @property
     def term_name(self) -> str:
-        with open(self.path / "title.txt") as f:
-            return f.read().strip()
+        if (title := get_catalog().titles.get(self.path)) is not None:
+            return title
+        return read_title(self.path)
 
     @property
     def part(self) -> Part:
@@ -119,22 +150,177 @@ class Term:
         return self.path.name <= other.path.name
 
     def get_courses(self) -> list[Course]:
-        return sorted(
-            (
-                c
-                for course in self.path.glob("*")
-                if course.is_dir() and (c := Course(course)).is_public()
-            ),
-            key=lambda course: course.path.name,
-        )
+        if (courses := get_catalog().courses.get(self.path)) is not None:
+            return list(courses)
+        return scan_courses(self.path)
 
 
-def get_years() -> list[Part]:
+def read_title(path: Path) -> str:
+    with open(path / "title.txt") as f:
+        return f.read().strip()
+
+
+def scan_years() -> list[Part]:
     years = [Part(i) for i in BASE_FOLDER.glob("year*")]
     years.sort()
     return years
 
 
+def scan_terms(path: Path) -> list[Term]:
+    return sorted((Term(i) for i in path.glob("term*")), key=lambda term: term.path.name)
+
+
+def scan_courses(path: Path) -> list[Course]:
+    return sorted(
+        (
+            c
+            for course in path.glob("*")
+            if course.is_dir() and (c := Course(course)).is_public()
+        ),
+        key=lambda course: course.path.name,
+    )
+
+
+@dataclass(frozen=True)
+class Catalog:
+    signature: tuple[tuple[str, int], ...]
+    years: tuple[Part, ...]
+    terms: dict[Path, tuple[Term, ...]]
+    courses: dict[Path, tuple[Course, ...]]
+    titles: dict[Path, str]
+    flags: dict[Path, CourseFlags]
+    by_code: dict[str, Course]
+    by_alias: dict[str, Course]
+    by_location: dict[tuple[str, str, str], Course]
+
+    @functools.cached_property
+    def digest(self) -> str:
+        return hashlib.blake2b(repr(self.signature).encode(), digest_size=16).hexdigest()
+
+    @classmethod
+    def empty(cls) -> Catalog:
+        return cls((), (), {}, {}, {}, {}, {}, {}, {})
+
+    @classmethod
+    def build(cls, signature: tuple[tuple[str, int], ...]) -> Catalog:
+        titles: dict[Path, str] = {}
+        terms: dict[Path, tuple[Term, ...]] = {}
+        courses: dict[Path, tuple[Course, ...]] = {}
+        flags: dict[Path, CourseFlags] = {}
+        by_code: dict[str, Course] = {}
+        by_alias: dict[str, Course] = {}
+        by_location: dict[tuple[str, str, str], Course] = {}
+
+        def load_title(path: Path) -> None:
+            try:
+                titles[path] = read_title(path)
+            except OSError:
+                pass
+
+        years = tuple(scan_years())
+        for year in years:
+            load_title(year.path)
+            terms[year.path] = tuple(scan_terms(year.path))
+            for term in terms[year.path]:
+                load_title(term.path)
+                courses[term.path] = tuple(scan_courses(term.path))
+                for course in courses[term.path]:
+                    load_title(course.path)
+                    flags[course.path] = CourseFlags.from_path(course.path)
+                    by_code.setdefault(course.course_code.lower(), course)
+                    by_location.setdefault(
+                        (year.path.name, term.path.name, course.course_code), course
+                    )
+                    try:
+                        acronyms = course.get_acronyms()
+                    except OSError:
+                        acronyms = [course.course_code.lower()]
+                    for acronym in acronyms:
+                        by_alias.setdefault(acronym, course)
+
+        return cls(
+            signature=signature,
+            years=years,
+            terms=terms,
+            courses=courses,
+            titles=titles,
+            flags=flags,
+            by_code=by_code,
+            by_alias=by_alias,
+            by_location=by_location,
+        )
+
+
+CATALOG_FILES = ("title.txt", "aliases.txt")
+
+
+def tree_signature() -> tuple[tuple[str, int], ...]:
+    signature: list[tuple[str, int]] = []
+
+    def visit_files(path: str) -> None:
+        for name in CATALOG_FILES:
+            file = os.path.join(path, name)
+            try:
+                signature.append((file, os.stat(file).st_mtime_ns))
+            except OSError:
+                pass
+
+    def visit(path: str, depth: int, prefix: str | None) -> None:
+        try:
+            with os.scandir(path) as entries:
+                for entry in entries:
+                    if prefix is not None and not entry.name.startswith(prefix):
+                        continue
+                    if not entry.is_dir():
+                        continue
+                    signature.append((entry.path, entry.stat().st_mtime_ns))
+                    visit_files(entry.path)
+                    if depth == 0:
+                        visit(entry.path, 1, "term")
+                    elif depth == 1:
+                        visit(entry.path, 2, None)
+        except OSError:
+            pass
+
+    try:
+        signature.append((str(BASE_FOLDER), BASE_FOLDER.stat().st_mtime_ns))
+    except OSError:
+        return ()
+    visit(str(BASE_FOLDER), 0, "year")
+    signature.sort()
+    return tuple(signature)
+
+
+_catalog = Catalog.empty()
+_catalog_checked_at: float | None = None
+_catalog_lock = threading.Lock()
+
+
+def get_catalog() -> Catalog:
+    global _catalog, _catalog_checked_at
+    now = time.monotonic()
+    if (
+        _catalog_checked_at is not None
+        and now - _catalog_checked_at < CATALOG_CHECK_INTERVAL
+    ):
+        return _catalog
+    with _catalog_lock:
+        if (
+            _catalog_checked_at is not None
+            and now - _catalog_checked_at < CATALOG_CHECK_INTERVAL
+        ):
+            return _catalog
+        signature = tree_signature()
+        if signature != _catalog.signature or _catalog_checked_at is None:
+            _catalog = Catalog.build(signature)
+        _catalog_checked_at = time.monotonic()
+        return _catalog
+
+
+def get_years() -> list[Part]:
+    return list(get_catalog().years)
+
+
 def part_to_year_number(part: str) -> str | None:
     return {
         "IA": "year1",
@@ -163,14 +349,14 @@ def get_courses() -> list[Course]:
 
 
 def get_course_from_alias(acronym: str) -> Course | None:
-    for course in get_courses():
-        if acronym.lower() in course.get_acronyms():
-            return course
-    return None
+    return get_catalog().by_alias.get(acronym.lower())
 
 
 def get_course_from_course_code(course_code: str) -> Course | None:
-    for course in get_courses():
-        if course_code.lower() == course.course_code.lower():
-            return course
-    return None
+    return get_catalog().by_code.get(course_code.lower())
+
+
+def get_course_from_location(
+    year_number: str, term_number: str, course_code: str
+) -> Course | None:
+    return get_catalog().by_location.get((year_number, term_number, course_code))
@@ -0,0 +1,49 @@
+import os
+
+from metrics import registry
+from warmup import mark_not_ready, mark_ready, warm_up
+
+preload_app = os.environ.get("GUNICORN_PRELOAD", "1") != "0"
+
+
+def on_starting(server):
+    mark_not_ready()
+    registry.clear_directory()
+    if server.cfg.workers > 1 and registry.directory is None:
+        server.log.warning(
+            "METRICS_DIR is not set, so /metrics only reports the worker that "
+            "answers each scrape"
+        )
+
+
+def when_ready(server):
+    if not preload_app:
+        mark_ready({})
+        return
+    try:
+        summary = warm_up(server.app.wsgi())
+    except Exception:
+        server.log.exception("Warm-up failed, starting workers cold")
+        summary = {}
+    else:
+        server.log.info("Warmed up before forking workers: %s", summary)
+    mark_ready(summary)
+
+
+def post_worker_init(worker):
+    if preload_app:
+        return
+    try:
+        summary = warm_up(worker.wsgi)
+    except Exception:
+        worker.log.exception("Warm-up failed, starting worker cold")
+    else:
+        worker.log.info("Warmed up worker: %s", summary)
+
+
+def child_exit(server, worker):
+    registry.remove_worker(worker.pid)
+
+
+def on_exit(server):
+    mark_not_ready()
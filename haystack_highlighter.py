@@ -1,8 +1,29 @@
+import functools
+import heapq
 import re
-from itertools import chain
 from typing import Iterator
 
-from markupsafe import Markup
+from markupsafe import Markup, escape
+
+from metrics import track_lru_cache
+
+
+@functools.lru_cache(maxsize=256)
+def compile_query_words(query_words: frozenset[str]) -> re.Pattern[str] | None:
+    if not query_words:
+        return None
+    alternatives = sorted(query_words, key=lambda word: (-len(word), word))
+    return re.compile("|".join(map(re.escape, alternatives)), flags=re.IGNORECASE)
+
+
+track_lru_cache("query_words", compile_query_words)
+
+
+def find_word(text: str, word: str) -> Iterator[int]:
+    position = text.find(word)
+    while position != -1:
+        yield position
+        position = text.find(word, position + len(word))
 
 
 class Highlighter:
@@ -16,9 +37,12 @@ class Highlighter:
         self.css_class = css_class
         self.html_tag = html_tag
         self.max_length = max_length
-        self.query_words = {
+        self.query_words = frozenset(
             word.lower() for word in query.split() if not word.startswith("-")
-        }
+        )
+        self.pattern = compile_query_words(self.query_words)
+        self.open_tag = f'<{html_tag} class="{escape(css_class)}">'
+        self.close_tag = f"</{html_tag}>"
 
     def highlight(self, text: str) -> str:
         chunks_to_use = []
@@ -26,58 +50,50 @@ class Highlighter:
         for chunk in self.get_chunk_texts(text):
             if total_length + len(chunk) > self.max_length:
                 break
-            chunks_to_use.append(chunk)
+            chunks_to_use.append(self.mark(chunk.strip()))
             total_length += len(chunk)
-        output = " ... ".join(chunk.strip() for chunk in chunks_to_use)
-        for word in self.query_words:
-            output = re.sub(
-                rf"(?i)({word})",
-                rf'<{self.html_tag} class="{self.css_class}">\1</{self.html_tag}>',
-                output,
-            )
-        return Markup(output)
-
-    def find_word_locations(self, text: str) -> dict[str, list[int]]:
-        word_locations: dict[str, list[int]] = {}
+        return Markup(" ... ".join(chunks_to_use))
+
+    def mark(self, text: str) -> Markup:
+        if self.pattern is None:
+            return escape(text)
+        output = []
+        position = 0
+        for match in self.pattern.finditer(text):
+            output.append(escape(text[position : match.start()]))
+            output.append(self.open_tag)
+            output.append(escape(match.group()))
+            output.append(self.close_tag)
+            position = match.end()
+        output.append(escape(text[position:]))
+        return Markup("".join(output))
+
+    def find_word_locations(self, text: str) -> Iterator[int]:
         lower_text_block = text.lower()
-        for word in self.query_words:
-            if word not in word_locations:
-                word_locations[word] = []
-            start_offset = 0
-            while start_offset < len(text):
-                next_offset = lower_text_block.find(word, start_offset)
-                if next_offset == -1:
-                    break
-                word_locations[word].append(next_offset)
-                start_offset = next_offset + len(word)
-        return word_locations
-
-    def get_unclipped_chunks(self, text: str) -> list[tuple[int, int]]:
-        word_locations = sorted(chain(*self.find_word_locations(text).values()))
-        chunks: list[tuple[int, int]] = []
-        if not word_locations:
-            return []
-        current_chunk_start = max(0, word_locations[0] - 30)
-        current_chunk_end = min(len(text), word_locations[0] + 35)
-        for position in word_locations:
+        return heapq.merge(
+            *(find_word(lower_text_block, word) for word in self.query_words)
+        )
+
+    def get_unclipped_chunks(self, text: str) -> Iterator[tuple[int, int]]:
+        current_chunk_start = current_chunk_end = -1
+        for position in self.find_word_locations(text):
             if position < current_chunk_end:
                 current_chunk_end = min(len(text), position + 35)
                 continue
-            chunks.append((current_chunk_start, current_chunk_end))
+            if current_chunk_end != -1:
+                yield current_chunk_start, current_chunk_end
             current_chunk_start = max(0, position - 30)
             current_chunk_end = min(len(text), position + 35)
-        chunks.append((current_chunk_start, current_chunk_end))
-        return chunks
+        if current_chunk_end != -1:
+            yield current_chunk_start, current_chunk_end
 
-    def get_chunks(self, text: str) -> list[tuple[int, int]]:
-        output = []
+    def get_chunks(self, text: str) -> Iterator[tuple[int, int]]:
         for start, end in self.get_unclipped_chunks(text):
             if start != 0 and text[start - 1] != " ":
                 start = text.find(" ", start, end) + 1
             if end != len(text) and text[end] != " ":
                 end = text.rfind(" ", start, end)
-            output.append((start, end))
-        return output
+            yield start, end
 
     def get_chunk_texts(self, text: str) -> Iterator[str]:
         for start, end in self.get_chunks(text):
@@ -1,12 +1,23 @@
-import functools
+import os
 import re
+import time
+from pathlib import Path
 
 from bs4 import BeautifulSoup, Tag
-from flask import render_template
+from flask import render_template, request
 
+from metrics import paginated_render_duration, track_cache
+from page_bundle import page_bundles
+from render_cache import RenderCache
+from scoped_css import CourseStylesheets, scoped_stylesheets
 
-@functools.cache
-def fix_paginated_html(course: str, content: str) -> str:
+RENDER_CACHE_BYTES = int(os.environ.get("RENDER_CACHE_BYTES", 64 * 1024 * 1024))
+
+render_cache = RenderCache(RENDER_CACHE_BYTES)
+track_cache("render", lambda: (render_cache.hits, render_cache.misses))
+
+
+def process_paginated_html(content: str) -> dict[str, str | bool | None]:
     content = re.sub(
         r"((?:Corollary|Theorem|Proposition|Lemma|Definition|Example|Remark)\W+)(<a[^>]+>)",
         r"\2\1",
@@ -60,14 +71,50 @@ def fix_paginated_html(course: str, content: str) -> str:
         if maybe_delete.decode_contents().strip() == "˙":
             maybe_delete.decompose()
 
+    return {
+        "content": body.decode_contents(),
+        "head": head.decode_contents(),
+        "include_navigation": include_navigation,
+        "has_previous": has_previous,
+        "previous_link": previous_link,
+        "has_next": has_next,
+        "next_link": next_link,
+    }
+
+
+def render_paginated_html(
+    course: str, data: dict[str, str | bool | None], stylesheets: CourseStylesheets
+) -> str:
     return render_template(
         "notes_paginated.html",
-        content=body.decode_contents(),
-        head=head.decode_contents(),
         course_code=course,
-        include_navigation=include_navigation,
-        has_previous=has_previous,
-        previous_link=previous_link,
-        has_next=has_next,
-        next_link=next_link,
+        **{**data, "head": stylesheets.rewrite_head(str(data["head"]))},
+    )
+
+
+def fix_paginated_html(course: str, file: Path) -> str:
+    stat = file.stat()
+    stylesheets = scoped_stylesheets.course(file.parent)
+
+    def render() -> str:
+        start = time.perf_counter()
+        if (data := page_bundles.page(file, stat)) is not None:
+            source = "bundle"
+        else:
+            source = "live"
+            data = process_paginated_html(file.read_text())
+        html = render_paginated_html(course, data, stylesheets)
+        paginated_render_duration.observe(source, value=time.perf_counter() - start)
+        return html
+
+    return render_cache.get_or_render(
+        (
+            course,
+            str(file),
+            stat.st_mtime_ns,
+            stat.st_size,
+            stylesheets.version,
+            request.query_string,
+        ),
+        render,
     )
@@ -1,7 +1,57 @@
+import functools
 import re
+from html import unescape
 from html.parser import HTMLParser
 from io import StringIO
-from pathlib import Path
+
+from metrics import track_lru_cache
+
+SKIPPED_TAGS = ("title", "style", "script")
+
+EMPTY_INLINE_MATH = "\x00"
+
+NAVIGATION_LINK = re.compile(r"\[(?:next|next-tail|prev|prev-tail|up|tail|front)\s*\]")
+
+WHITESPACE_RUN = re.compile(r"\s{2,}")
+
+LIST_LABEL = re.compile(
+    r"^(\((?:[ivx]{1,4}|[abcdefghijklmnopqrstuvwxyz])\)) *\n\n", flags=re.MULTILINE
+)
+
+THEOREM_HEADING = re.compile(
+    r"""(?x)
+    (
+        (?:
+            Theorem
+            |Lemma
+            |Proposition
+            |Corollary
+            |Definition
+            |Example
+            |Notation
+            |Conjecture
+        )\s*
+        (?:
+            \d+
+            (?:\.\d+){0,2}
+        )?
+        (?:
+            \(
+                .*?
+            \)
+        )?
+        \.
+    )\n
+    """
+)
+
+PROOF_HEADING = re.compile(r"(Proof.?\.)\n")
+
+
+MATH_TOKEN = re.compile(
+    r"""<(?:!--.*?--|(/?)([a-zA-Z][-.a-zA-Z0-9:_]*)(?:[^>"']|"[^"]*"|'[^']*')*?(/?))>""",
+    flags=re.DOTALL,
+)
 
 
 class MLStripper(HTMLParser):
@@ -35,50 +85,146 @@ def strip_tags(html: str) -> str:
     return s.get_data()
 
 
-def process_math(match: re.Match[str]) -> str:
-    inline = 'display="inline"' in match.group(0)
-    output = match.group(0)
-    output = output.replace("\u2061", " ")
-    output = strip_tags(output).strip()
+def strip_math_tags(math: str) -> str:
+    if "<style" in math or "<script" in math or "<title>" in math:
+        math = re.sub(r"<title>.*?</title>", "", math)
+        math = re.sub(r"<style[^>]*>.*?</style>", "", math, flags=re.DOTALL)
+        math = re.sub(r"<script[^>]*>.*?</script>", "", math, flags=re.DOTALL)
+        return strip_tags(math)
+    output = []
+    position = 0
+    for token in MATH_TOKEN.finditer(math):
+        if (data := math[position : token.start()]):
+            if "<" in data:
+                return strip_tags(math)
+            output.append(unescape(data) if "&" in data else data)
+        position = token.end()
+        if (tag := token.group(2)) is None:
+            continue
+        tag = tag.lower()
+        end_tag = token.group(1) == "/"
+        if not end_tag and tag in ("li", "ul"):
+            output.append("\n\n")
+        if end_tag or token.group(3) == "/":
+            if not tag.startswith("mjx"):
+                output.append("\n")
+            if tag in ("li", "ul"):
+                output.append("\n\n")
+    return "".join(output)
+
+
+def process_math(math: str) -> str:
+    inline = 'display="inline"' in math
+    output = math.replace("\u2061", " ")
+    output = strip_math_tags(output).strip()
     output = output.replace("\n", " ")
     output = re.sub(r"\s+", " ", output)
-    if inline:
-        return f"STARTMATH{output}ENDMATH"
-    else:
+    if "&" in output:
+        output = unescape(output)
+    if not inline:
         return f"\n\n\\[\n{output}\n\\]\n\n"
+    return output or EMPTY_INLINE_MATH
+
+
+class TextConverter(HTMLParser):
+    def __init__(self) -> None:
+        super().__init__(convert_charrefs=True)
+        self.parts: list[str] = []
+        self.skipping: str | None = None
+        self.skipped: list[str] = []
+        self.entering_math = False
+
+    def updatepos(self, i: int, j: int) -> int:
+        return j
+
+    def parse_starttag(self, i: int) -> int:
+        end = super().parse_starttag(i)
+        if not self.entering_math:
+            return end
+        self.entering_math = False
+        if (close := self.rawdata.find("</math>", end)) == -1:
+            return end
+        close += len("</math>")
+        self.parts.append(process_math(self.rawdata[i:close]))
+        return close
+
+    def handle_data(self, data: str) -> None:
+        if self.skipping is not None:
+            self.skipped.append(data)
+        else:
+            self.parts.append(data)
+
+    def handle_starttag(self, tag: str, attrs: list[tuple[str, str | None]]) -> None:
+        if self.skipping is not None:
+            return
+        if tag in SKIPPED_TAGS and (tag != "title" or self.get_starttag_text() == "<title>"):
+            self.skipping = tag
+            self.skipped = []
+        elif tag == "math":
+            self.entering_math = True
+        elif tag in ("li", "ul"):
+            self.parts.append("\n\n")
+
+    def handle_endtag(self, tag: str) -> None:
+        if self.skipping is not None:
+            if tag != self.skipping:
+                return
+            self.skipping = None
+            if tag == "title" and any("\n" in data for data in self.skipped):
+                self.parts.extend(self.skipped)
+                self.parts.append("\n")
+            return
+        if not tag.startswith("mjx"):
+            self.parts.append("\n")
+        if tag in ("li", "ul"):
+            self.parts.append("\n\n")
+
+    def get_text(self) -> str:
+        return "".join(self.parts)
+
+
+@functools.lru_cache(maxsize=1024)
+def normalise_whitespace_run(run: str) -> str:
+    run = re.sub(r" +", " ", run)
+    run = re.sub(r"\n *", "\n", run)
+    return re.sub(r"(\n\s*)+\n", "\n\n", run)
 
 
-def process_paragraph(match: re.Match[str]) -> str:
-    text = match.group(0)
-    if text.startswith("\\["):
+track_lru_cache("whitespace_runs", normalise_whitespace_run)
+
+
+def process_paragraph(text: str) -> str:
+    if "\n" not in text or text.startswith("\\["):
         return text
     text = re.sub(r"\n([,.?:])", r"\1", text)
-    text = text.replace("\n", " ")
-    return text
+    return text.replace("\n", " ")
 
 
 def concat_paragraph_lines(text: str) -> str:
-    while (
-        new_text := re.sub(
-            r"(?<=\n\n).*?(?=\n\n)", process_paragraph, text, flags=re.DOTALL
-        )
-    ) != text:
-        text = new_text
-    return text
+    paragraphs = text.split("\n\n")
+    for i in range(1, len(paragraphs) - 1):
+        paragraphs[i] = process_paragraph(paragraphs[i])
+    return "\n\n".join(paragraphs)
 
 
 def wrap_line(line: str) -> str:
+    if len(line) < 80 and not line.startswith(" "):
+        return line
     output_lines = []
-    current_line = ""
+    current_words: list[str] = []
+    current_length = 0
     for word in line.split(" "):
-        if len(f"{current_line} {word}") > 80:
-            output_lines.append(current_line)
-            current_line = ""
-        if current_line:
-            current_line = f"{current_line} {word}"
+        if current_length + 1 + len(word) > 80:
+            output_lines.append(" ".join(current_words))
+            current_words = []
+            current_length = 0
+        if current_length:
+            current_words.append(word)
+            current_length += 1 + len(word)
         else:
-            current_line = word
-    output_lines.append(current_line)
+            current_words = [word]
+            current_length = len(word)
+    output_lines.append(" ".join(current_words))
     return "\n".join(output_lines)
 
 
@@ -87,53 +233,18 @@ def wrap_lines(text: str) -> str:
 
 
 def html2text(html: str) -> str:
-    output = html
-    output = re.sub(r"<title>.*?</title>", "", output)
-    output = re.sub(r"<style[^>]*>.*?</style>", "", output, flags=re.DOTALL)
-    output = re.sub(r"<script[^>]*>.*?</script>", "", output, flags=re.DOTALL)
-    output = re.sub(r"<math[^>]*>.*?</math>", process_math, output, flags=re.DOTALL)
-    output = strip_tags(output).strip()
-    output = re.sub(r"\[(?:next|next-tail|prev|prev-tail|up|tail|front)\s*\]", "", output).strip()
-    output = re.sub(r"STARTMATH", "", output)
-    output = re.sub(r"ENDMATH", "", output)
-    output = re.sub(r" +", " ", output)
-    output = re.sub(r"\n *", "\n", output)
-    output = re.sub(r"(\n\s*)+\n", "\n\n", output)
-    output = re.sub(
-        r"^(\((?:[ivx]{1,4}|[abcdefghijklmnopqrstuvwxyz])\)) *\n\n",
-        r"\1 ",
-        output,
-        flags=re.MULTILINE,
-    )
-    output = re.sub(
-        r"""(?x)
-        (
-            (?:
-                Theorem
-                |Lemma
-                |Proposition
-                |Corollary
-                |Definition
-                |Example
-                |Notation
-                |Conjecture
-            )\s*
-            (?:
-                \d+
-                (?:\.\d+){0,2}
-            )?
-            (?:
-                \(
-                    .*?
-                \)
-            )?
-            \.
-        )\n
-        """,
-        r"\1",
-        output,
+    converter = TextConverter()
+    converter.feed(html)
+    output = converter.get_text().strip()
+    output = NAVIGATION_LINK.sub("", output).strip()
+    if EMPTY_INLINE_MATH in output:
+        output = output.replace(EMPTY_INLINE_MATH, "")
+    output = WHITESPACE_RUN.sub(
+        lambda match: normalise_whitespace_run(match.group(0)), output
     )
-    output = re.sub(r"(Proof.?\.)\n", r"\1", output)
+    output = LIST_LABEL.sub(r"\1 ", output)
+    output = THEOREM_HEADING.sub(r"\1", output)
+    output = PROOF_HEADING.sub(r"\1", output)
     output = concat_paragraph_lines(output)
     output = wrap_lines(output)
     return output
@@ -0,0 +1,63 @@
+import hashlib
+import os
+from collections.abc import Callable
+from pathlib import Path
+
+from flask import Response, make_response, request
+from flask.typing import ResponseReturnValue
+
+DEFAULT_MAX_AGES = {
+    "notes_home": 60,
+    "notes_html_paginated": 300,
+    "notes_search_suggest": 60,
+    "notes_sources": 60,
+}
+
+TEMPLATE_FOLDER = Path(__file__).parent / "templates"
+
+
+def max_age(route: str) -> int:
+    return int(
+        os.environ.get(f"CACHE_MAX_AGE_{route.upper()}", DEFAULT_MAX_AGES.get(route, 0))
+    )
+
+
+def template_version(folder: Path) -> str:
+    signature = sorted(
+        (path.name, path.stat().st_mtime_ns) for path in folder.glob("*.html")
+    )
+    return hashlib.blake2b(repr(signature).encode(), digest_size=8).hexdigest()
+
+
+TEMPLATE_VERSION = template_version(TEMPLATE_FOLDER)
+
+
+def make_etag(*parts: object) -> str:
+    return hashlib.blake2b(
+        repr((TEMPLATE_VERSION, request.query_string, parts)).encode(), digest_size=12
+    ).hexdigest()
+
+
+def stat_etag(stat: os.stat_result, *parts: object) -> str:
+    return make_etag(stat.st_ino, stat.st_mtime_ns, stat.st_size, *parts)
+
+
+def is_fresh(etag: str) -> bool:
+    if request.method not in ("GET", "HEAD"):
+        return False
+    return request.if_none_match.contains_weak(etag)
+
+
+def conditional_response(
+    route: str,
+    etag: str,
+    render: Callable[[], ResponseReturnValue],
+) -> Response:
+    if is_fresh(etag):
+        response = Response(status=304)
+    else:
+        response = make_response(render())
+    response.set_etag(etag)
+    response.cache_control.public = True
+    response.cache_control.max_age = max_age(route)
+    return response
@@ -1,52 +1,188 @@
-from contextlib import asynccontextmanager
+import argparse
+import asyncio
+import hashlib
+import os
 import re
-from typing import AsyncIterator
+import sqlite3
+from concurrent.futures import Executor, ProcessPoolExecutor
+from pathlib import Path
 
 from asonic import Client
 from asonic.client import Channel
-from asonic.connection import asyncio
 
+from embedded_index import EMBEDDED_INDEX_PATH, SEARCH_BACKEND, write_index
 from generate_webpage import Course, get_courses
 from html_to_txt import html2text
+from sonic_pool import SonicPool
+from suggest_index import SUGGEST_INDEX_PATH, write_suggestions
+from text_store import ManifestEntry, StoredPage, page_title, text_store
 
+INGEST_CONNECTIONS = int(os.environ.get("INGEST_CONNECTIONS", 4))
+INDEX_CONCURRENCY = int(os.environ.get("INDEX_CONCURRENCY", 2 * (os.cpu_count() or 1)))
 
-@asynccontextmanager
-async def create_ingest_client() -> AsyncIterator[Client]:
-    client = Client(host="search")
-    await client.channel(Channel.INGEST)
-    yield client
-    await client.quit()
 
+def extract_page(
+    html_file: Path, known_sha256: str | None
+) -> tuple[int, int, StoredPage | None]:
+    stat = html_file.stat()
+    data = html_file.read_bytes()
+    sha256 = hashlib.sha256(data).hexdigest()
+    if sha256 == known_sha256:
+        return stat.st_mtime_ns, stat.st_size, None
+    html = data.decode()
+    if "\r" in html:
+        html = html.replace("\r\n", "\n").replace("\r", "\n")
+    page = StoredPage(
+        page_title(html), html2text(html), stat.st_mtime_ns, stat.st_size, sha256
+    )
+    return stat.st_mtime_ns, stat.st_size, page
 
-async def index_course(course: Course) -> None:
+
+def page_key(course: Course, html_file: Path) -> str:
+    return str(
+        course.part.part_name
+        + "/"
+        + course.term.term_name
+        + "/"
+        + course.course_code
+        + "/HTML/"
+        + html_file.name
+    )
+
+
+class Indexer:
+    def __init__(
+        self,
+        executor: Executor,
+        ingest_pool: SonicPool | None,
+        connection: sqlite3.Connection,
+        manifest: dict[str, ManifestEntry],
+    ) -> None:
+        self.executor = executor
+        self.ingest_pool = ingest_pool
+        self.connection = connection
+        self.manifest = manifest
+        self.semaphore = asyncio.Semaphore(INDEX_CONCURRENCY)
+        self.seen: set[str] = set()
+        self.added: list[str] = []
+        self.changed: list[str] = []
+        self.touched = 0
+        self.unchanged = 0
+        self.removed: list[str] = []
+
+    async def index_page(self, key: str, html_file: Path) -> None:
+        self.seen.add(key)
+        known = self.manifest.get(key)
+        if known is not None:
+            stat = html_file.stat()
+            if (known.mtime_ns, known.size) == (stat.st_mtime_ns, stat.st_size):
+                self.unchanged += 1
+                return
+        async with self.semaphore:
+            mtime_ns, size, page = await asyncio.get_running_loop().run_in_executor(
+                self.executor,
+                extract_page,
+                html_file,
+                known.sha256 if known is not None else None,
+            )
+            if page is None:
+                text_store.touch(self.connection, key, mtime_ns, size)
+                self.touched += 1
+                return
+            if self.ingest_pool is not None:
+                text = re.sub(r"[^a-z0-9A-Z]", " ", page.text)
+                text = text.replace("\n", " ")
+
+                async def ingest(client: Client) -> None:
+                    await client.flusho("html_notes", "default", key)
+                    await client.push("html_notes", "default", key, text)
+
+                await self.ingest_pool.run(ingest)
+            text_store.put(self.connection, key, page)
+            (self.added if known is None else self.changed).append(key)
+
+    async def remove_page(self, key: str) -> None:
+        if self.ingest_pool is not None:
+            await self.ingest_pool.run(
+                lambda client: client.flusho("html_notes", "default", key)
+            )
+        text_store.delete(self.connection, key)
+        self.removed.append(key)
+
+    def print_summary(self) -> None:
+        for label, keys in (
+            ("added", self.added),
+            ("changed", self.changed),
+            ("removed", self.removed),
+        ):
+            for key in sorted(keys):
+                print(f"{label:>8} {key}")
+        print(
+            f"{len(self.added)} added, {len(self.changed)} changed, "
+            f"{len(self.removed)} removed, "
+            f"{self.unchanged + self.touched} unchanged"
+            f" ({self.touched} touched without content changes)"
+        )
+
+
+async def index_course(course: Course, indexer: Indexer) -> None:
     path = course.path / "HTML_paginated"
     if not path.exists():
         return
-    async with create_ingest_client() as ingest_client:
-        for html_file in path.glob("*.html"):
-            text = html2text(html_file.read_text())
-            text = re.sub(r"[^a-z0-9A-Z]", " ", text)
-            # html_file.with_suffix(".txt").write_text(text)
-            key = str(
-                course.part.part_name
-                + "/"
-                + course.term.term_name
-                + "/"
-                + course.course_code
-                + "/HTML/"
-                + html_file.name
-            )
-            text = text.replace("\n", " ")
-            await ingest_client.flusho("html_notes", "default", key)
-            await ingest_client.push("html_notes", "default", key, text)
+    await asyncio.gather(
+        *(
+            indexer.index_page(page_key(course, html_file), html_file)
+            for html_file in path.glob("*.html")
+        )
+    )
 
 
-async def index_all_htmls() -> None:
-    for course in get_courses():
-        await index_course(course)
+async def index_all_htmls(full: bool = False) -> None:
+    ingest_pool = (
+        SonicPool(Channel.INGEST, max_size=INGEST_CONNECTIONS)
+        if SEARCH_BACKEND == "sonic"
+        else None
+    )
+    connection = text_store.connect()
+    try:
+        manifest = {} if full else text_store.manifest(connection)
+        with ProcessPoolExecutor() as executor:
+            indexer = Indexer(executor, ingest_pool, connection, manifest)
+            await asyncio.gather(
+                *(index_course(course, indexer) for course in get_courses())
+            )
+        removed = text_store.manifest(connection).keys() - indexer.seen
+        if removed and not indexer.seen:
+            print("No pages found, not removing any pages from the index")
+        else:
+            await asyncio.gather(*(indexer.remove_page(key) for key in removed))
+        connection.commit()
+        indexer.print_summary()
+        if SEARCH_BACKEND == "embedded":
+            documents, terms = write_index(
+                text_store.texts(connection), EMBEDDED_INDEX_PATH
+            )
+            print(f"Wrote {EMBEDDED_INDEX_PATH} ({documents} pages, {terms} terms)")
+        words, titles = write_suggestions(
+            text_store.documents(connection), SUGGEST_INDEX_PATH
+        )
+        print(f"Wrote {SUGGEST_INDEX_PATH} ({words} words, {titles} titles)")
+        text_store.bump_generation(connection)
+        connection.commit()
+    finally:
+        connection.close()
+        if ingest_pool is not None:
+            await ingest_pool.close()
 
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description=f"Index HTML notes into the {SEARCH_BACKEND} search backend."
+    )
+    parser.add_argument(
+        "--full", action="store_true", help="reindex pages even if unchanged"
+    )
+    args = parser.parse_args()
     loop = asyncio.new_event_loop()
-    loop.run_until_complete(index_all_htmls())
+    loop.run_until_complete(index_all_htmls(args.full))
     print("Finished indexing HTML files")
@@ -0,0 +1,368 @@
+import bisect
+import json
+import os
+import tempfile
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections.abc import Callable
+from pathlib import Path
+from typing import Any
+
+METRICS_DIR = os.environ.get("METRICS_DIR")
+METRICS_FLUSH_INTERVAL = float(os.environ.get("METRICS_FLUSH_INTERVAL", 5))
+METRICS_TOKEN = os.environ.get("METRICS_TOKEN")
+
+DEFAULT_BUCKETS = (
+    0.0005,
+    0.001,
+    0.0025,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+    10.0,
+)
+
+LabelValues = tuple[str, ...]
+
+
+def format_labels(names: tuple[str, ...], values: LabelValues, **extra: str) -> str:
+    pairs = [*zip(names, values), *extra.items()]
+    if not pairs:
+        return ""
+    escaped = (
+        (name, value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n"))
+        for name, value in pairs
+    )
+    return "{" + ",".join(f'{name}="{value}"' for name, value in escaped) + "}"
+
+
+def format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Metric(ABC):
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labels: tuple[str, ...]) -> None:
+        self.name = name
+        self.documentation = documentation
+        self.labels = labels
+        self._values: dict[LabelValues, Any] = {}
+        self._lock = threading.Lock()
+
+    def reset(self) -> None:
+        with self._lock:
+            self._values.clear()
+
+    def snapshot(self) -> list[list[Any]]:
+        with self._lock:
+            return [[list(labels), value] for labels, value in self._values.items()]
+
+    @abstractmethod
+    def merge(self, current: Any, other: Any) -> Any: ...
+
+    @abstractmethod
+    def expose(self, samples: dict[LabelValues, Any]) -> list[str]: ...
+
+
+class Counter(Metric):
+    kind = "counter"
+
+    def inc(self, *labels: str, amount: float = 1) -> None:
+        registry.touch()
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def set_total(self, *labels: str, total: float) -> None:
+        with self._lock:
+            self._values[labels] = total
+
+    def merge(self, current: Any, other: Any) -> Any:
+        return (current or 0) + other
+
+    def expose(self, samples: dict[LabelValues, Any]) -> list[str]:
+        return [
+            f"{self.name}{format_labels(self.labels, labels)} {format_value(value)}"
+            for labels, value in sorted(samples.items())
+        ]
+
+
+class Timer:
+    __slots__ = ("histogram", "labels", "start")
+
+    def __init__(self, histogram: "Histogram", labels: LabelValues) -> None:
+        self.histogram = histogram
+        self.labels = labels
+        self.start = 0.0
+
+    def __enter__(self) -> "Timer":
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info: object) -> None:
+        self.histogram.observe(*self.labels, value=time.perf_counter() - self.start)
+
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labels: tuple[str, ...] = (),
+        buckets: tuple[float, ...] = DEFAULT_BUCKETS,
+    ) -> None:
+        super().__init__(name, documentation, labels)
+        self.buckets = buckets
+
+    def observe(self, *labels: str, value: float) -> None:
+        registry.touch()
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            if (state := self._values.get(labels)) is None:
+                state = self._values[labels] = [[0] * (len(self.buckets) + 1), 0.0]
+            state[0][index] += 1
+            state[1] += value
+
+    def time(self, *labels: str) -> Timer:
+        return Timer(self, labels)
+
+    def snapshot(self) -> list[list[Any]]:
+        with self._lock:
+            return [
+                [list(labels), [list(counts), total]]
+                for labels, (counts, total) in self._values.items()
+            ]
+
+    def merge(self, current: Any, other: Any) -> Any:
+        if current is None:
+            return [list(other[0]), other[1]]
+        for i, count in enumerate(other[0]):
+            current[0][i] += count
+        current[1] += other[1]
+        return current
+
+    def expose(self, samples: dict[LabelValues, Any]) -> list[str]:
+        lines = []
+        for labels, (counts, total) in sorted(samples.items()):
+            cumulative = 0
+            for bound, count in zip((*self.buckets, float("inf")), counts):
+                cumulative += count
+                lines.append(
+                    f"{self.name}_bucket"
+                    f"{format_labels(self.labels, labels, le=format_value(bound))} "
+                    f"{cumulative}"
+                )
+            lines.append(
+                f"{self.name}_sum{format_labels(self.labels, labels)} {total!r}"
+            )
+            lines.append(
+                f"{self.name}_count{format_labels(self.labels, labels)} {cumulative}"
+            )
+        return lines
+
+
+class Registry:
+    def __init__(self, directory: str | None) -> None:
+        self.directory = Path(directory) if directory else None
+        self.metrics: dict[str, Metric] = {}
+        self.collectors: list[Callable[[], None]] = []
+        self.reset_hooks: list[Callable[[], None]] = []
+        self.flushing = True
+        self._pid = os.getpid()
+        self._file: Path | None = None
+        self._flusher: threading.Thread | None = None
+        self._dirty = False
+        self._lock = threading.Lock()
+
+    def counter(
+        self, name: str, documentation: str, labels: tuple[str, ...] = ()
+    ) -> Counter:
+        metric = self.metrics[name] = Counter(name, documentation, labels)
+        return metric
+
+    def histogram(
+        self,
+        name: str,
+        documentation: str,
+        labels: tuple[str, ...] = (),
+        buckets: tuple[float, ...] = DEFAULT_BUCKETS,
+    ) -> Histogram:
+        metric = self.metrics[name] = Histogram(name, documentation, labels, buckets)
+        return metric
+
+    def collector(self, collect: Callable[[], None]) -> None:
+        self.collectors.append(collect)
+
+    def touch(self) -> None:
+        if self._pid != os.getpid():
+            self._after_fork()
+        self._dirty = True
+        if self.directory is not None and self._flusher is None and self.flushing:
+            self._start_flusher()
+
+    def _after_fork(self) -> None:
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            for metric in self.metrics.values():
+                metric.reset()
+            self._pid = os.getpid()
+            self._file = None
+            self._flusher = None
+
+    def reset(self) -> None:
+        with self._lock:
+            for metric in self.metrics.values():
+                metric.reset()
+            for hook in self.reset_hooks:
+                hook()
+            self._dirty = False
+
+    def _start_flusher(self) -> None:
+        with self._lock:
+            if self._flusher is not None:
+                return
+            self._flusher = threading.Thread(
+                target=self._flush_periodically, name="metrics-flush", daemon=True
+            )
+            self._flusher.start()
+
+    def _flush_periodically(self) -> None:
+        pid = os.getpid()
+        while self._pid == pid:
+            time.sleep(METRICS_FLUSH_INTERVAL)
+            if self._dirty:
+                self.flush()
+
+    def snapshot(self) -> dict[str, list[list[Any]]]:
+        for collect in self.collectors:
+            collect()
+        return {name: metric.snapshot() for name, metric in self.metrics.items()}
+
+    def flush(self) -> None:
+        if self.directory is None:
+            return
+        self._dirty = False
+        snapshot = self.snapshot()
+        if self._file is None:
+            self._file = self.directory / f"worker-{os.getpid()}-{time.time_ns()}.json"
+        self.directory.mkdir(parents=True, exist_ok=True)
+        with tempfile.NamedTemporaryFile(
+            "w", dir=self.directory, prefix=".worker-", delete=False
+        ) as f:
+            try:
+                json.dump(snapshot, f, separators=(",", ":"))
+            except BaseException:
+                os.unlink(f.name)
+                raise
+        os.replace(f.name, self._file)
+
+    def worker_snapshots(self) -> list[dict[str, list[list[Any]]]]:
+        if self.directory is None:
+            return [self.snapshot()]
+        self.flush()
+        snapshots = []
+        for file in self.directory.glob("worker-*.json"):
+            try:
+                snapshots.append(json.loads(file.read_text()))
+            except (OSError, ValueError):
+                continue
+        return snapshots
+
+    def aggregate(self) -> dict[str, dict[LabelValues, Any]]:
+        merged: dict[str, dict[LabelValues, Any]] = {name: {} for name in self.metrics}
+        for snapshot in self.worker_snapshots():
+            for name, samples in snapshot.items():
+                if (metric := self.metrics.get(name)) is None:
+                    continue
+                for labels, value in samples:
+                    key = tuple(labels)
+                    merged[name][key] = metric.merge(merged[name].get(key), value)
+        return merged
+
+    def expose(self) -> str:
+        lines = []
+        for name, samples in self.aggregate().items():
+            metric = self.metrics[name]
+            lines.append(f"# HELP {name} {metric.documentation}")
+            lines.append(f"# TYPE {name} {metric.kind}")
+            lines.extend(metric.expose(samples))
+        return "\n".join(lines) + "\n"
+
+    def clear_directory(self) -> None:
+        if self.directory is None:
+            return
+        for file in self.directory.glob("worker-*.json"):
+            file.unlink(missing_ok=True)
+
+    def remove_worker(self, pid: int) -> None:
+        if self.directory is None:
+            return
+        for file in self.directory.glob(f"worker-{pid}-*.json"):
+            file.unlink(missing_ok=True)
+
+
+registry = Registry(METRICS_DIR)
+
+request_duration = registry.histogram(
+    "notes_request_duration_seconds", "Time spent handling requests.", ("route",)
+)
+requests_total = registry.counter(
+    "notes_requests_total", "Requests handled.", ("route", "status")
+)
+search_backend_duration = registry.histogram(
+    "notes_search_backend_duration_seconds",
+    "Time spent querying the search backend, including Sonic round trips.",
+    ("backend",),
+)
+html2text_duration = registry.histogram(
+    "notes_html2text_duration_seconds",
+    "Time spent converting a search result page to text.",
+)
+highlight_duration = registry.histogram(
+    "notes_highlight_duration_seconds",
+    "Time spent highlighting a search result.",
+)
+paginated_render_duration = registry.histogram(
+    "notes_paginated_render_duration_seconds",
+    "Time spent rendering a paginated notes page on a render cache miss.",
+    ("source",),
+)
+cache_hits = registry.counter("notes_cache_hits_total", "Cache hits.", ("cache",))
+cache_misses = registry.counter("notes_cache_misses_total", "Cache misses.", ("cache",))
+
+
+def track_cache(name: str, stats: Callable[[], tuple[int, int]]) -> None:
+    baseline = (0, 0)
+
+    def collect() -> None:
+        hits, misses = stats()
+        cache_hits.set_total(name, total=hits - baseline[0])
+        cache_misses.set_total(name, total=misses - baseline[1])
+
+    def reset() -> None:
+        nonlocal baseline
+        baseline = stats()
+
+    registry.collector(collect)
+    registry.reset_hooks.append(reset)
+
+
+def track_lru_cache(name: str, function: Any) -> None:
+    def stats() -> tuple[int, int]:
+        info = function.cache_info()
+        return info.hits, info.misses
+
+    track_cache(name, stats)
@@ -0,0 +1,150 @@
+import json
+import mmap
+import os
+import struct
+import tempfile
+import threading
+from dataclasses import dataclass
+from pathlib import Path
+
+BUNDLE_NAME = "pages.bundle"
+MAGIC = b"NOTESPG1"
+HEADER = struct.Struct("<8sQQ")
+
+PageData = dict[str, str | bool | None]
+
+
+@dataclass(frozen=True)
+class BundleEntry:
+    mtime_ns: int
+    size: int
+    offset: int
+    head_length: int
+    content_length: int
+    fields_length: int
+
+
+def bundle_path(folder: Path) -> Path:
+    return folder / BUNDLE_NAME
+
+
+def encode_page(data: PageData) -> tuple[bytes, bytes, bytes]:
+    fields = {
+        key: value for key, value in data.items() if key not in ("head", "content")
+    }
+    return (
+        str(data["head"]).encode(),
+        str(data["content"]).encode(),
+        json.dumps(fields, separators=(",", ":")).encode(),
+    )
+
+
+def write_bundle(folder: Path, pages: dict[str, tuple[int, int, PageData]]) -> None:
+    path = bundle_path(folder)
+    index = {}
+    with tempfile.NamedTemporaryFile(
+        dir=folder, prefix=f".{path.name}.", delete=False
+    ) as f:
+        try:
+            f.write(bytes(HEADER.size))
+            for name, (mtime_ns, size, data) in sorted(pages.items()):
+                head, content, fields = encode_page(data)
+                index[name] = [
+                    mtime_ns,
+                    size,
+                    f.tell(),
+                    len(head),
+                    len(content),
+                    len(fields),
+                ]
+                f.write(head)
+                f.write(content)
+                f.write(fields)
+            index_offset = f.tell()
+            encoded_index = json.dumps(index, separators=(",", ":")).encode()
+            f.write(encoded_index)
+            f.seek(0)
+            f.write(HEADER.pack(MAGIC, index_offset, len(encoded_index)))
+            f.flush()
+            os.fsync(f.fileno())
+        except BaseException:
+            os.unlink(f.name)
+            raise
+    os.replace(f.name, path)
+
+
+class PageBundle:
+    def __init__(self, path: Path) -> None:
+        with open(path, "rb") as f:
+            self.signature = os.fstat(f.fileno())
+            self.map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, index_offset, index_length = HEADER.unpack_from(self.map)
+        if magic != MAGIC:
+            raise ValueError(f"{path} is not a page bundle")
+        self.index = {
+            name: BundleEntry(*entry)
+            for name, entry in json.loads(
+                self.map[index_offset : index_offset + index_length]
+            ).items()
+        }
+
+    def names(self) -> list[str]:
+        return list(self.index)
+
+    def entry(self, name: str) -> BundleEntry | None:
+        return self.index.get(name)
+
+    def page(self, name: str) -> PageData | None:
+        if (entry := self.index.get(name)) is None:
+            return None
+        head_end = entry.offset + entry.head_length
+        content_end = head_end + entry.content_length
+        fields_end = content_end + entry.fields_length
+        data: PageData = json.loads(self.map[content_end:fields_end])
+        data["head"] = self.map[entry.offset : head_end].decode()
+        data["content"] = self.map[head_end:content_end].decode()
+        return data
+
+
+def open_bundle(folder: Path) -> PageBundle | None:
+    try:
+        return PageBundle(bundle_path(folder))
+    except (OSError, ValueError):
+        return None
+
+
+class PageBundles:
+    def __init__(self) -> None:
+        self._bundles: dict[Path, PageBundle] = {}
+        self._lock = threading.Lock()
+
+    def get(self, folder: Path) -> PageBundle | None:
+        try:
+            stat = bundle_path(folder).stat()
+        except FileNotFoundError:
+            return None
+        bundle = self._bundles.get(folder)
+        if bundle is not None and (
+            (bundle.signature.st_ino, bundle.signature.st_mtime_ns)
+            == (stat.st_ino, stat.st_mtime_ns)
+        ):
+            return bundle
+        if (bundle := open_bundle(folder)) is None:
+            return None
+        with self._lock:
+            self._bundles[folder] = bundle
+        return bundle
+
+    def page(self, file: Path, stat: os.stat_result) -> PageData | None:
+        if (bundle := self.get(file.parent)) is None:
+            return None
+        entry = bundle.entry(file.name)
+        if entry is None or (entry.mtime_ns, entry.size) != (
+            stat.st_mtime_ns,
+            stat.st_size,
+        ):
+            return None
+        return bundle.page(file.name)
+
+
+page_bundles = PageBundles()
@@ -0,0 +1,96 @@
+import argparse
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+
+from generate_webpage import get_courses
+from html_fixing import process_paginated_html
+from page_bundle import PageData, open_bundle, write_bundle
+
+
+def precompile_page(html_file: Path) -> tuple[int, int, PageData, float]:
+    start = time.perf_counter()
+    source_stat = html_file.stat()
+    data = process_paginated_html(html_file.read_text())
+    return (
+        source_stat.st_mtime_ns,
+        source_stat.st_size,
+        data,
+        time.perf_counter() - start,
+    )
+
+
+def find_pages(
+    force: bool,
+) -> tuple[
+    dict[Path, dict[str, tuple[int, int, PageData]]], list[Path], set[Path], int
+]:
+    reused: dict[Path, dict[str, tuple[int, int, PageData]]] = {}
+    pages = []
+    outdated = set()
+    skipped = 0
+    for course in get_courses():
+        folder = course.path / "HTML_paginated"
+        if not folder.is_dir():
+            continue
+        bundle = None if force else open_bundle(folder)
+        reused[folder] = {}
+        for html_file in sorted(folder.glob("*.html")):
+            stat = html_file.stat()
+            entry = bundle.entry(html_file.name) if bundle is not None else None
+            if entry is not None and (entry.mtime_ns, entry.size) == (
+                stat.st_mtime_ns,
+                stat.st_size,
+            ):
+                page = bundle.page(html_file.name)
+                assert page is not None
+                reused[folder][html_file.name] = (entry.mtime_ns, entry.size, page)
+                skipped += 1
+                continue
+            pages.append(html_file)
+            outdated.add(folder)
+        if bundle is None or bundle.names() != sorted(reused[folder]):
+            outdated.add(folder)
+    return reused, pages, outdated, skipped
+
+
+def precompile_all_htmls(jobs: int | None, force: bool) -> None:
+    start = time.perf_counter()
+    bundles, pages, outdated, skipped = find_pages(force)
+    failed = 0
+    with ProcessPoolExecutor(max_workers=jobs) as executor:
+        futures = {executor.submit(precompile_page, page): page for page in pages}
+        for future in as_completed(futures):
+            page = futures[future]
+            try:
+                mtime_ns, size, data, elapsed = future.result()
+            except Exception as e:
+                failed += 1
+                print(f"  failed  {page}: {e!r}")
+                continue
+            bundles[page.parent][page.name] = (mtime_ns, size, data)
+            print(f"{elapsed * 1000:8.1f}ms {page}")
+    for folder, records in bundles.items():
+        if folder in outdated:
+            write_bundle(folder, records)
+        for stale in folder.glob("*.html_processed"):
+            stale.unlink()
+    print(
+        f"Precompiled {len(pages) - failed} pages into {len(outdated)} "
+        f"bundles, skipped {skipped} unchanged, {failed} failed "
+        f"in {time.perf_counter() - start:.1f}s"
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Write an HTML_paginated/pages.bundle for every course."
+    )
+    parser.add_argument(
+        "-j", "--jobs", type=int, default=None, help="number of worker processes"
+    )
+    parser.add_argument(
+        "-f", "--force", action="store_true", help="rebuild unchanged pages too"
+    )
+    args = parser.parse_args()
+    precompile_all_htmls(args.jobs, args.force)
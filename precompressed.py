@@ -0,0 +1,51 @@
+import mimetypes
+from pathlib import Path
+
+from flask import Response, request, send_file
+
+ENCODINGS = (("br", ".br"), ("gzip", ".gz"))
+
+COMPRESSIBLE_EXTENSIONS = (".html", ".css", ".svg", ".js", ".tex", ".4ht", ".txt")
+
+RENDERED_FOLDER = "HTML_paginated"
+RENDERED_EXTENSIONS = (".html", ".css")
+
+
+def is_rendered(file: Path) -> bool:
+    return file.parent.name == RENDERED_FOLDER and file.suffix in RENDERED_EXTENSIONS
+
+
+def compressed_path(file: Path, suffix: str) -> Path:
+    return file.with_name(file.name + suffix)
+
+
+def fresh_variant(file: Path) -> tuple[str, Path] | None:
+    try:
+        mtime_ns = file.stat().st_mtime_ns
+    except FileNotFoundError:
+        return None
+    for encoding, suffix in ENCODINGS:
+        if not request.accept_encodings[encoding]:
+            continue
+        variant = compressed_path(file, suffix)
+        try:
+            if variant.stat().st_mtime_ns == mtime_ns:
+                return encoding, variant
+        except FileNotFoundError:
+            continue
+    return None
+
+
+def send_precompressed(file: Path, mimetype: str | None = None) -> Response:
+    if mimetype is None:
+        mimetype = mimetypes.guess_type(file.name)[0] or "application/octet-stream"
+    if file.suffix not in COMPRESSIBLE_EXTENSIONS:
+        return send_file(file, mimetype=mimetype)
+    if (variant := fresh_variant(file)) is None:
+        response = send_file(file, mimetype=mimetype)
+    else:
+        encoding, path = variant
+        response = send_file(path, mimetype=mimetype)
+        response.content_encoding = encoding
+    response.vary.add("Accept-Encoding")
+    return response
@@ -0,0 +1,195 @@
+import cProfile
+import os
+import random
+import re
+import secrets
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter
+from collections.abc import Callable, Iterable, Iterator
+from pathlib import Path
+from types import FrameType
+from typing import Any
+
+PROFILE_REQUESTS = os.environ.get("PROFILE_REQUESTS") is not None
+PROFILE_DIR = Path(os.environ.get("PROFILE_DIR", "profiles"))
+PROFILE_TOKEN = os.environ.get("PROFILE_TOKEN")
+PROFILE_SAMPLE_RATE = float(os.environ.get("PROFILE_SAMPLE_RATE", 0))
+PROFILE_KEEP = int(os.environ.get("PROFILE_KEEP", 200))
+PROFILE_FORMAT = os.environ.get("PROFILE_FORMAT", "collapsed")
+PROFILE_STACK_INTERVAL = float(os.environ.get("PROFILE_STACK_INTERVAL", 0.001))
+
+PROFILE_HEADER = "X-Profile"
+PROFILED_THREAD_PREFIXES = ("search-hydrate",)
+EXTENSIONS = {"pstats": ".prof", "collapsed": ".folded"}
+
+
+def frame_name(frame: FrameType) -> str:
+    code = frame.f_code
+    return (
+        f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+    )
+
+
+def is_idle_worker(frame: FrameType) -> bool:
+    code = frame.f_code
+    return code.co_name == "_worker" and code.co_filename.endswith(
+        os.path.join("concurrent", "futures", "thread.py")
+    )
+
+
+class StackSampler:
+    def __init__(self, interval: float = PROFILE_STACK_INTERVAL) -> None:
+        self.interval = interval
+        self.stacks: Counter[str] = Counter()
+        self._stop = threading.Event()
+        self._thread: threading.Thread | None = None
+        self._request_thread = 0
+        self._existing_threads: set[int] = set()
+
+    def enable(self) -> None:
+        self._request_thread = threading.get_ident()
+        self._existing_threads = {
+            thread.ident
+            for thread in threading.enumerate()
+            if thread.ident is not None
+            and not thread.name.startswith(PROFILED_THREAD_PREFIXES)
+        }
+        self._existing_threads.discard(self._request_thread)
+        self._thread = threading.Thread(
+            target=self._sample, name="profile-sampler", daemon=True
+        )
+        self._thread.start()
+
+    def disable(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    def _sample(self) -> None:
+        sampler = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            for ident, frame in sys._current_frames().items():
+                if ident == sampler or ident in self._existing_threads:
+                    continue
+                if is_idle_worker(frame):
+                    continue
+                stack = []
+                current: FrameType | None = frame
+                while current is not None:
+                    stack.append(frame_name(current))
+                    current = current.f_back
+                stack.append(names.get(ident, str(ident)))
+                self.stacks[";".join(reversed(stack))] += 1
+
+    def dump_stats(self, file: str) -> None:
+        Path(file).write_text(
+            "".join(
+                f"{stack} {count}\n" for stack, count in sorted(self.stacks.items())
+            )
+        )
+
+
+def create_profiler() -> cProfile.Profile | StackSampler:
+    if PROFILE_FORMAT == "collapsed":
+        return StackSampler()
+    return cProfile.Profile()
+
+
+def write_profile(profile: cProfile.Profile | StackSampler, name: str) -> Path:
+    PROFILE_DIR.mkdir(parents=True, exist_ok=True)
+    path = PROFILE_DIR / (name + EXTENSIONS.get(PROFILE_FORMAT, ".prof"))
+    fd, temporary = tempfile.mkstemp(dir=PROFILE_DIR, prefix=f".{path.name}.")
+    os.close(fd)
+    try:
+        profile.dump_stats(temporary)
+    except BaseException:
+        os.unlink(temporary)
+        raise
+    os.replace(temporary, path)
+    rotate_profiles()
+    return path
+
+
+def rotate_profiles() -> None:
+    profiles = sorted(
+        file
+        for file in PROFILE_DIR.iterdir()
+        if file.suffix in EXTENSIONS.values() and not file.name.startswith(".")
+    )
+    for file in profiles[: max(0, len(profiles) - PROFILE_KEEP)]:
+        file.unlink(missing_ok=True)
+
+
+def profile_name(environ: dict[str, Any]) -> str:
+    path = re.sub(r"[^A-Za-z0-9_.-]+", "_", environ.get("PATH_INFO", "")).strip("_")
+    return (
+        f"{time.time_ns()}-{os.getpid()}-{environ.get('REQUEST_METHOD', 'GET')}"
+        f"-{path[:80] or 'root'}"
+    )
+
+
+class ProfiledResponse:
+    def __init__(self, body: Iterable[bytes], finish: Callable[[], None]) -> None:
+        self.body = body
+        self.finish = finish
+
+    def __iter__(self) -> Iterator[bytes]:
+        return iter(self.body)
+
+    def close(self) -> None:
+        try:
+            if (close := getattr(self.body, "close", None)) is not None:
+                close()
+        finally:
+            self.finish()
+
+
+class RequestProfiler:
+    def __init__(self, app: Callable[..., Iterable[bytes]]) -> None:
+        self.app = app
+        self._lock = threading.Lock()
+
+    def requested(self, environ: dict[str, Any]) -> bool:
+        token = environ.get("HTTP_" + PROFILE_HEADER.upper().replace("-", "_"))
+        if PROFILE_TOKEN and secrets.compare_digest(
+            (token or "").encode(), PROFILE_TOKEN.encode()
+        ):
+            return True
+        return PROFILE_SAMPLE_RATE > 0 and random.random() < PROFILE_SAMPLE_RATE
+
+    def __call__(
+        self, environ: dict[str, Any], start_response: Callable[..., Any]
+    ) -> Iterable[bytes]:
+        if not self.requested(environ) or not self._lock.acquire(blocking=False):
+            return self.app(environ, start_response)
+        profile = create_profiler()
+        name = profile_name(environ)
+
+        def finish() -> None:
+            try:
+                profile.disable()
+                write_profile(profile, name)
+            finally:
+                self._lock.release()
+
+        def profiled_start_response(
+            status: str, headers: list[tuple[str, str]], *args: Any
+        ) -> Any:
+            headers.append((PROFILE_HEADER + "-Id", name))
+            return start_response(status, headers, *args)
+
+        try:
+            profile.enable()
+        except ValueError:
+            self._lock.release()
+            return self.app(environ, start_response)
+        try:
+            body = self.app(environ, profiled_start_response)
+        except BaseException:
+            finish()
+            raise
+        return ProfiledResponse(body, finish)
@@ -0,0 +1,106 @@
+import hashlib
+import os
+import re
+import threading
+import time
+from dataclasses import dataclass, field
+from pathlib import Path
+
+STYLESHEET_CHECK_INTERVAL = float(os.environ.get("STYLESHEET_CHECK_INTERVAL", "2"))
+STYLESHEET_MAX_AGE = 365 * 24 * 60 * 60
+
+STYLESHEET_LINK = re.compile(r'(<link\b[^>]*\bhref=")([^"/:]+\.css)(")')
+
+
+def scope_css(css: str) -> str:
+    replacements = [
+        (r"body {([^}]*)}", ""),
+        (r"@media \(prefers-color-scheme: dark\) {[^}]*}", ""),
+    ]
+    css = f"#pagecontent {{ {css} }}"
+    for pattern, replacement in replacements:
+        css = re.sub(pattern, replacement, css)
+    return css
+
+
+def scope_stylesheet(file: Path) -> str:
+    return scope_css(file.read_text())
+
+
+def stylesheet_url(digest: str) -> str:
+    return f"_css/{digest}.css"
+
+
+@dataclass(frozen=True)
+class CourseStylesheets:
+    signature: tuple[tuple[str, int, int], ...]
+    digests: dict[str, str] = field(default_factory=dict)
+    by_digest: dict[str, str] = field(default_factory=dict)
+
+    @property
+    def version(self) -> tuple[str, ...]:
+        return tuple(sorted(self.by_digest))
+
+    def rewrite_head(self, head: str) -> str:
+        def replace(match: re.Match[str]) -> str:
+            if (digest := self.digests.get(match.group(2))) is None:
+                return match.group(0)
+            return match.group(1) + stylesheet_url(digest) + match.group(3)
+
+        return STYLESHEET_LINK.sub(replace, head)
+
+
+def stylesheet_signature(folder: Path) -> tuple[tuple[str, int, int], ...]:
+    signature = []
+    try:
+        with os.scandir(folder) as entries:
+            for entry in entries:
+                if entry.name.endswith(".css") and entry.is_file():
+                    stat = entry.stat()
+                    signature.append((entry.name, stat.st_mtime_ns, stat.st_size))
+    except OSError:
+        return ()
+    signature.sort()
+    return tuple(signature)
+
+
+def compile_stylesheets(
+    folder: Path, signature: tuple[tuple[str, int, int], ...]
+) -> CourseStylesheets:
+    stylesheets = CourseStylesheets(signature)
+    for name, _, _ in signature:
+        try:
+            css = scope_stylesheet(folder / name)
+        except OSError:
+            continue
+        digest = hashlib.sha256(css.encode()).hexdigest()[:20]
+        stylesheets.digests[name] = digest
+        stylesheets.by_digest.setdefault(digest, css)
+    return stylesheets
+
+
+class ScopedStylesheets:
+    def __init__(self) -> None:
+        self._courses: dict[Path, tuple[float, CourseStylesheets]] = {}
+        self._lock = threading.Lock()
+
+    def course(self, folder: Path) -> CourseStylesheets:
+        now = time.monotonic()
+        cached = self._courses.get(folder)
+        if cached is not None and now - cached[0] < STYLESHEET_CHECK_INTERVAL:
+            return cached[1]
+        signature = stylesheet_signature(folder)
+        if cached is not None and cached[1].signature == signature:
+            stylesheets = cached[1]
+        else:
+            stylesheets = compile_stylesheets(folder, signature)
+        with self._lock:
+            self._courses[folder] = (time.monotonic(), stylesheets)
+        return stylesheets
+
+    def clear(self) -> None:
+        with self._lock:
+            self._courses.clear()
+
+
+scoped_stylesheets = ScopedStylesheets()
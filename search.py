@@ -1,55 +1,191 @@
 import asyncio
-import re
-from contextlib import asynccontextmanager
-from typing import AsyncIterator
+import contextvars
+import os
+from collections.abc import Iterator
+from concurrent.futures import ThreadPoolExecutor, as_completed
 
-from asonic import Client
 from asonic.client import Channel
-from flask import url_for
+from flask import current_app, url_for
 
+from embedded_index import SEARCH_BACKEND, embedded_index
 from generate_webpage import get_course_from_course_code
 from html_to_txt import html2text
 from haystack_highlighter import Highlighter
+from metrics import (
+    cache_hits,
+    cache_misses,
+    highlight_duration,
+    html2text_duration,
+    search_backend_duration,
+    track_cache,
+)
+from search_cache import SearchCache
+from sonic_pool import BackgroundLoop, SonicPool
+from text_store import page_title, text_store
 
+SONIC_POOL_SIZE = int(os.environ.get("SONIC_POOL_SIZE", 4))
+SONIC_ACQUIRE_TIMEOUT = float(os.environ.get("SONIC_ACQUIRE_TIMEOUT", 5))
+SEARCH_HYDRATE_WORKERS = int(os.environ.get("SEARCH_HYDRATE_WORKERS", 4))
+SEARCH_PAGE_SIZE = int(os.environ.get("SEARCH_PAGE_SIZE", 10))
+SEARCH_MAX_PAGE_SIZE = 100
+SEARCH_CACHE_SIZE = int(os.environ.get("SEARCH_CACHE_SIZE", 1024))
+SEARCH_CACHE_TTL = float(os.environ.get("SEARCH_CACHE_TTL", 300))
 
-@asynccontextmanager
-async def create_search_client() -> AsyncIterator[Client]:
-    client = Client(host="search")
-    await client.channel(Channel.SEARCH)
-    yield client
-    await client.quit()
+search_loop = BackgroundLoop()
+search_pool = SonicPool(
+    Channel.SEARCH, max_size=SONIC_POOL_SIZE, acquire_timeout=SONIC_ACQUIRE_TIMEOUT
+)
+hydrate_executor = ThreadPoolExecutor(
+    max_workers=SEARCH_HYDRATE_WORKERS, thread_name_prefix="search-hydrate"
+)
+search_cache: SearchCache[list["SearchResult"]] = SearchCache(
+    SEARCH_CACHE_SIZE, SEARCH_CACHE_TTL
+)
+track_cache("search_results", lambda: (search_cache.hits, search_cache.misses))
+
+
+def page_href(file_path: str) -> str:
+    year, term, course_code, html, file_name = file_path.split("/")
+    return url_for(
+        "notes_html",
+        year=year,
+        term=term,
+        course=course_code,
+        html_file=f"HTML/{file_name}",
+    )
 
 
 class SearchResult:
     def __init__(self, query: str, file_path: str) -> None:
-        year, term, course_code, html, file_name = file_path.split("/")
+        self.key = file_path
+        _, _, course_code, _, file_name = file_path.split("/")
         course = get_course_from_course_code(course_code)
         assert course
         file = course.path / "HTML_paginated" / file_name
-        file_text = file.read_text()
-        self.text = html2text(file_text)
-        self.highlighted = Highlighter(query).highlight(self.text.replace("\n", " "))
-        self.title = (
-            re.search(r"<title>(.*?)</title>", file_text)
-            .group(1)
-            .rsplit("-", maxsplit=1)[0]
-            .strip()
-        )
-        self.href = url_for(
-            "notes_html",
-            year=year,
-            term=term,
-            course=course_code,
-            html_file=f"HTML/{file_name}",
+        stat = file.stat()
+        stored = text_store.get(file_path)
+        if (
+            stored is not None
+            and stored.mtime_ns == stat.st_mtime_ns
+            and stored.size == stat.st_size
+        ):
+            cache_hits.inc("text_store")
+            text = stored.text
+            self.title = stored.title
+        else:
+            cache_misses.inc("text_store")
+            file_text = file.read_text()
+            with html2text_duration.time():
+                text = html2text(file_text)
+            self.title = page_title(file_text)
+        with highlight_duration.time():
+            self.highlighted = Highlighter(query).highlight(text.replace("\n", " "))
+        self.href = page_href(file_path)
+
+
+async def query_sonic(query: str, limit: int, offset: int) -> list[bytes]:
+    with search_backend_duration.time("sonic"):
+        return await search_pool.query(
+            "html_notes", "default", query, limit, offset
         )
 
 
-async def search_htmls(query: str) -> list[SearchResult]:
-    async with create_search_client() as search_client:
-        return [
-            SearchResult(query, result.decode())
-            for result in await search_client.query("html_notes", "default", query)
-        ]
+def normalise_query(query: str) -> str:
+    return " ".join(query.lower().split())
+
+
+def search_window(query: str, limit: int, offset: int) -> tuple[str, int, int]:
+    return (
+        normalise_query(query),
+        max(1, min(limit, SEARCH_MAX_PAGE_SIZE)),
+        max(0, offset),
+    )
+
+
+def search_keys(query: str, limit: int, offset: int) -> list[str]:
+    if SEARCH_BACKEND == "embedded":
+        with search_backend_duration.time("embedded"):
+            return embedded_index.search(query, limit, offset)
+    return [
+        key.decode()
+        for key in search_loop.submit(query_sonic(query, limit, offset)).result()
+    ]
+
+
+async def search_htmls(
+    query: str, limit: int = SEARCH_PAGE_SIZE, offset: int = 0
+) -> list[SearchResult]:
+    query, limit, offset = search_window(query, limit, offset)
+    loop = asyncio.get_running_loop()
+    generation = await loop.run_in_executor(hydrate_executor, text_store.generation)
+    cache_key = (SEARCH_BACKEND, query, limit, offset)
+    if (cached := search_cache.get(generation, cache_key)) is not None:
+        return cached
+    keys = await loop.run_in_executor(
+        hydrate_executor, search_keys, query, limit, offset
+    )
+    results = await asyncio.gather(
+        *(
+            loop.run_in_executor(
+                hydrate_executor,
+                contextvars.copy_context().run,
+                SearchResult,
+                query,
+                key,
+            )
+            for key in keys
+        ),
+        return_exceptions=True,
+    )
+    loaded = []
+    for key, result in zip(keys, results):
+        if isinstance(result, SearchResult):
+            loaded.append(result)
+        elif isinstance(result, Exception):
+            current_app.logger.error(
+                "Failed to load search result %s", key, exc_info=result
+            )
+        else:
+            raise result
+    if len(loaded) == len(keys):
+        search_cache.put(generation, cache_key, loaded)
+    return loaded
+
+
+def iter_search_htmls(
+    query: str, limit: int = SEARCH_PAGE_SIZE, offset: int = 0
+) -> Iterator[tuple[int, str, SearchResult | Exception]]:
+    query, limit, offset = search_window(query, limit, offset)
+    generation = text_store.generation()
+    cache_key = (SEARCH_BACKEND, query, limit, offset)
+    if (cached := search_cache.get(generation, cache_key)) is not None:
+        for rank, result in enumerate(cached):
+            yield rank, result.key, result
+        return
+    keys = search_keys(query, limit, offset)
+    futures = {
+        hydrate_executor.submit(
+            contextvars.copy_context().run, SearchResult, query, key
+        ): rank
+        for rank, key in enumerate(keys)
+    }
+    results: dict[int, SearchResult] = {}
+    try:
+        for future in as_completed(futures):
+            rank = futures[future]
+            try:
+                results[rank] = result = future.result()
+            except Exception as e:
+                yield rank, keys[rank], e
+                continue
+            yield rank, result.key, result
+    finally:
+        for future in futures:
+            future.cancel()
+    if len(results) == len(keys):
+        search_cache.put(
+            generation, cache_key, [results[rank] for rank in range(len(keys))]
+        )
 
 
 if __name__ == "__main__":
@@ -0,0 +1,170 @@
+import asyncio
+import concurrent.futures
+import os
+import threading
+import time
+from collections.abc import Awaitable, Callable, Coroutine
+from contextlib import asynccontextmanager, suppress
+from typing import Any, AsyncIterator, TypeVar
+
+from asonic import Client
+from asonic.client import Channel, escape
+from asonic.enums import Command
+from asonic.exceptions import ConnectionClosed
+
+SONIC_HOST = os.environ.get("SONIC_HOST", "search")
+SONIC_PORT = int(os.environ.get("SONIC_PORT", 1491))
+SONIC_PASSWORD = os.environ.get("SONIC_PASSWORD", "SecretPassword")
+
+T = TypeVar("T")
+
+CONNECTION_ERRORS = (OSError, EOFError, asyncio.IncompleteReadError, ConnectionClosed)
+
+
+class UnhealthyConnection(ConnectionError):
+    pass
+
+
+async def checked_query(
+    client: Client, collection: str, bucket: str, terms: str, limit: int, offset: int
+) -> list[bytes]:
+    response = await client._command(
+        Command.QUERY, collection, bucket, escape(terms), limit=limit, offset=offset
+    )
+    if response.split()[:2] != [b"EVENT", b"QUERY"]:
+        raise ConnectionClosed(f"Unexpected reply to QUERY: {response!r}")
+    return response.split()[3:]
+
+
+def close_client(client: Client) -> None:
+    if (pool := client.pool) is None:
+        return
+    pool.closed = True
+    connections = list(pool._in_use_connections)
+    while not pool._available_connections.empty():
+        connections.append(pool._available_connections.get_nowait())
+    for connection in connections:
+        if connection.writer is not None:
+            connection.writer.close()
+
+
+class SonicPool:
+    def __init__(
+        self,
+        channel: Channel,
+        max_size: int = 4,
+        acquire_timeout: float = 5.0,
+        check_after: float = 30.0,
+        host: str = SONIC_HOST,
+        port: int = SONIC_PORT,
+        password: str = SONIC_PASSWORD,
+    ) -> None:
+        self.channel = channel
+        self.max_size = max_size
+        self.acquire_timeout = acquire_timeout
+        self.check_after = check_after
+        self.host = host
+        self.port = port
+        self.password = password
+        self._reset()
+
+    def _reset(self) -> None:
+        self._pid = os.getpid()
+        self._idle: list[tuple[Client, float]] = []
+        self._semaphore = asyncio.Semaphore(self.max_size)
+
+    async def _connect(self) -> Client:
+        client = Client(
+            host=self.host, port=self.port, password=self.password, max_connections=1
+        )
+        await client.channel(self.channel)
+        await self._check(client)
+        return client
+
+    async def _check(self, client: Client) -> None:
+        if (response := await client.ping()) != b"PONG":
+            raise UnhealthyConnection(f"Unexpected reply to PING: {response!r}")
+
+    def _discard(self, client: Client) -> None:
+        with suppress(Exception):
+            close_client(client)
+
+    async def _checkout(self) -> Client:
+        while self._idle:
+            client, last_used = self._idle.pop()
+            if time.monotonic() - last_used < self.check_after:
+                return client
+            try:
+                await asyncio.wait_for(self._check(client), self.acquire_timeout)
+            except CONNECTION_ERRORS:
+                self._discard(client)
+                continue
+            return client
+        return await asyncio.wait_for(self._connect(), self.acquire_timeout)
+
+    @asynccontextmanager
+    async def acquire(self) -> AsyncIterator[Client]:
+        if self._pid != os.getpid():
+            self._reset()
+        await asyncio.wait_for(self._semaphore.acquire(), self.acquire_timeout)
+        try:
+            client = await self._checkout()
+            try:
+                yield client
+            except BaseException:
+                self._discard(client)
+                raise
+            self._idle.append((client, time.monotonic()))
+        finally:
+            self._semaphore.release()
+
+    async def run(
+        self, operation: Callable[[Client], Awaitable[T]], retries: int = 1
+    ) -> T:
+        for attempt in range(retries + 1):
+            try:
+                async with self.acquire() as client:
+                    return await operation(client)
+            except TimeoutError:
+                raise
+            except CONNECTION_ERRORS:
+                if attempt == retries:
+                    raise
+        raise AssertionError("unreachable")
+
+    async def query(
+        self, collection: str, bucket: str, terms: str, limit: int, offset: int
+    ) -> list[bytes]:
+        return await self.run(
+            lambda client: checked_query(
+                client, collection, bucket, terms, limit, offset
+            )
+        )
+
+    async def close(self) -> None:
+        while self._idle:
+            client, _ = self._idle.pop()
+            self._discard(client)
+
+
+class BackgroundLoop:
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._loop: asyncio.AbstractEventLoop | None = None
+        self._pid: int | None = None
+
+    def _get_loop(self) -> asyncio.AbstractEventLoop:
+        with self._lock:
+            if self._loop is None or self._pid != os.getpid():
+                self._loop = asyncio.new_event_loop()
+                self._pid = os.getpid()
+                threading.Thread(
+                    target=self._loop.run_forever, name="sonic-pool", daemon=True
+                ).start()
+            return self._loop
+
+    def submit(self, coro: Coroutine[Any, Any, T]) -> concurrent.futures.Future[T]:
+        return asyncio.run_coroutine_threadsafe(coro, self._get_loop())
+
+    async def run(self, coro: Coroutine[Any, Any, T]) -> T:
+        return await asyncio.wrap_future(self.submit(coro))
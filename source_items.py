@@ -6,6 +6,8 @@ import os
 from pathlib import Path
 import re
 
+from metrics import track_lru_cache
+
 
 EXCLUDED_EXTENSIONS = (
     ".apkg",
@@ -35,6 +37,7 @@ EXCLUDED_EXTENSIONS = (
     ".ptc8",
     ".ptc9",
     ".gz",
+    ".br",
     ".toc",
     ".tsqx",
 )
@@ -48,41 +51,50 @@ EXTENSION_TO_ICON = {
     ".svg": "filetype-svg",
     ".css": "filetype-css",
     ".html_processed": "file-earmark-binary",
+    ".bundle": "file-earmark-binary",
     ".txt": "filetype-txt",
 }
 
 
-@functools.total_ordering
+SOURCE_LISTING_CACHE_SIZE = int(os.environ.get("SOURCE_LISTING_CACHE_SIZE", 256))
+
+LECTURE_NUMBER = re.compile(r"lecture(\d\d?).tex")
+
+
+def is_hidden(name: str) -> bool:
+    _, file_extension = os.path.splitext(name)
+    return name == "result" or file_extension in EXCLUDED_EXTENSIONS
+
+
+def sort_key(name: str, is_dir: bool) -> tuple:
+    if is_dir:
+        return (0, name)
+    _, file_extension = os.path.splitext(name)
+    if file_extension != ".tex":
+        return (2, name)
+    if not name.startswith("lecture"):
+        return (1, 0, 0, name)
+    if match := LECTURE_NUMBER.match(name):
+        return (1, 1, int(match.group(1)), name)
+    return (1, 1, float("inf"), name)
+
+
 class Item:
-    def __init__(self, path: Path) -> None:
+    def __init__(self, path: Path, is_dir: bool, mtime: float) -> None:
         self.path = path
+        self._is_dir = is_dir
+        self.mtime = mtime
+        self.sort_key = sort_key(path.name, is_dir)
+
+    @classmethod
+    def from_entry(cls, entry: os.DirEntry[str]) -> Item:
+        return cls(Path(entry.path), entry.is_dir(), entry.stat().st_mtime)
 
     def is_dir(self) -> bool:
-        return self.path.is_dir()
+        return self._is_dir
 
     def __lt__(self, other: Item) -> bool:
-        if self.is_dir() and not other.is_dir():
-            return True
-        if not self.is_dir() and other.is_dir():
-            return False
-        if self.is_dir() and other.is_dir():
-            return self.path.name < other.path.name
-        if self.file_extension() == ".tex":
-            if other.file_extension() == ".tex":
-                if self.path.name.startswith("lecture") and other.path.name.startswith("lecture"):
-                    num_self = re.match(r"lecture(\d\d?).tex", self.path.name).group(1)
-                    num_other = re.match(r"lecture(\d\d?).tex", other.path.name).group(1)
-                    return int(num_self) < int(num_other)
-                if self.path.name.startswith("lecture"):
-                    return False
-                if other.path.name.startswith("lecture"):
-                    return True
-                return self.path.name < other.path.name
-            else:
-                return True
-        if other.file_extension() == ".tex":
-            return False
-        return self.path.name < other.path.name
+        return self.sort_key < other.sort_key
 
     def __str__(self) -> str:
         if self.is_dir():
@@ -110,6 +122,31 @@ class Item:
             return EXTENSION_TO_ICON.get(self.file_extension(), "file-earmark")
 
     def last_edited(self) -> str:
-        edited_unix_timestamp = os.path.getmtime(self.path)
-        edited_datetime = datetime.datetime.fromtimestamp(edited_unix_timestamp)
+        edited_datetime = datetime.datetime.fromtimestamp(self.mtime)
         return f"Edited: {edited_datetime.strftime('%a %d %b %Y')}"
+
+
+def scan_directory(folder: Path) -> tuple[Item, ...]:
+    items = []
+    with os.scandir(folder) as entries:
+        for entry in entries:
+            if is_hidden(entry.name):
+                continue
+            try:
+                items.append(Item.from_entry(entry))
+            except FileNotFoundError:
+                continue
+    items.sort(key=lambda item: item.sort_key)
+    return tuple(items)
+
+
+@functools.lru_cache(maxsize=SOURCE_LISTING_CACHE_SIZE)
+def _cached_listing(folder: Path, mtime_ns: int) -> tuple[Item, ...]:
+    return scan_directory(folder)
+
+
+track_lru_cache("source_listing", _cached_listing)
+
+
+def list_directory(folder: Path) -> tuple[Item, ...]:
+    return _cached_listing(folder, folder.stat().st_mtime_ns)
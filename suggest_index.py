@@ -0,0 +1,146 @@
+import bisect
+import heapq
+import json
+import os
+import tempfile
+import threading
+from collections import Counter
+from collections.abc import Iterable
+from pathlib import Path
+
+from embedded_index import tokenize
+from generate_webpage import BASE_FOLDER
+
+SUGGEST_INDEX_PATH = Path(
+    os.environ.get("SUGGEST_INDEX_PATH", BASE_FOLDER / ".search_suggest.json")
+)
+SUGGEST_LIMIT = int(os.environ.get("SUGGEST_LIMIT", 8))
+SUGGEST_MAX_LIMIT = 20
+MIN_WORD_LENGTH = 2
+
+
+def write_suggestions(
+    documents: Iterable[tuple[str, str, str]], path: Path
+) -> tuple[int, int]:
+    frequencies: Counter[str] = Counter()
+    titles = []
+    for key, title, text in documents:
+        frequencies.update(set(tokenize(text)) | set(tokenize(title)))
+        if title:
+            titles.append((title, key))
+    words = sorted(
+        word
+        for word in frequencies
+        if len(word) >= MIN_WORD_LENGTH and not word.isdigit()
+    )
+    titles.sort()
+    data = {
+        "words": words,
+        "frequencies": [frequencies[word] for word in words],
+        "titles": titles,
+    }
+    with tempfile.NamedTemporaryFile(
+        "w", dir=path.parent, prefix=f".{path.name}.", delete=False
+    ) as f:
+        try:
+            json.dump(data, f, separators=(",", ":"))
+            f.flush()
+            os.fsync(f.fileno())
+        except BaseException:
+            os.unlink(f.name)
+            raise
+    os.replace(f.name, path)
+    return len(words), len(titles)
+
+
+def prefix_range(items: list[str], prefix: str) -> tuple[int, int]:
+    return (
+        bisect.bisect_left(items, prefix),
+        bisect.bisect_left(items, prefix + "\U0010ffff"),
+    )
+
+
+class Suggestions:
+    def __init__(self, path: Path) -> None:
+        with open(path, "rb") as f:
+            self.signature = os.fstat(f.fileno())
+            data = json.load(f)
+        self.words: list[str] = data["words"]
+        self.frequencies: list[int] = data["frequencies"]
+        self.titles: list[tuple[str, str]] = [tuple(title) for title in data["titles"]]
+        self.title_words = [set(tokenize(title)) for title, _ in self.titles]
+        tokens = sorted(
+            (token, i) for i, words in enumerate(self.title_words) for token in words
+        )
+        self.title_tokens = [token for token, _ in tokens]
+        self.title_ids = [i for _, i in tokens]
+
+    def complete(self, prefix: str, limit: int) -> list[str]:
+        start, end = prefix_range(self.words, prefix)
+        best = heapq.nsmallest(
+            limit, range(start, end), key=lambda i: (-self.frequencies[i], i)
+        )
+        return [self.words[i] for i in best]
+
+    def matching_titles(
+        self, words: list[str], prefix: str, limit: int
+    ) -> list[tuple[str, str]]:
+        start, end = prefix_range(self.title_tokens, prefix)
+        required = set(words)
+        matches = {
+            i for i in self.title_ids[start:end] if required <= self.title_words[i]
+        }
+        best = heapq.nsmallest(
+            limit,
+            matches,
+            key=lambda i: (
+                not self.titles[i][0].lower().startswith(prefix),
+                len(self.titles[i][0]),
+                i,
+            ),
+        )
+        return [self.titles[i] for i in best]
+
+    def suggest(
+        self, query: str, limit: int
+    ) -> tuple[list[str], list[tuple[str, str]]]:
+        words = tokenize(query)
+        if not words:
+            return [], []
+        if query[-1:].isalnum():
+            *words, prefix = words
+        else:
+            prefix = ""
+        stem = " ".join(words)
+        completions = (
+            [f"{stem} {word}".strip() for word in self.complete(prefix, limit)]
+            if prefix
+            else []
+        )
+        return completions, self.matching_titles(words, prefix, limit)
+
+
+class SuggestIndex:
+    def __init__(self, path: Path) -> None:
+        self.path = path
+        self._suggestions: Suggestions | None = None
+        self._lock = threading.Lock()
+
+    def current(self) -> Suggestions | None:
+        try:
+            stat = self.path.stat()
+        except FileNotFoundError:
+            return None
+        suggestions = self._suggestions
+        if suggestions is not None and (
+            (suggestions.signature.st_ino, suggestions.signature.st_mtime_ns)
+            == (stat.st_ino, stat.st_mtime_ns)
+        ):
+            return suggestions
+        with self._lock:
+            if self._suggestions is suggestions:
+                self._suggestions = Suggestions(self.path)
+            return self._suggestions
+
+
+suggest_index = SuggestIndex(SUGGEST_INDEX_PATH)
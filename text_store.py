@@ -0,0 +1,146 @@
+import os
+import re
+import sqlite3
+import threading
+from collections.abc import Iterator
+from dataclasses import dataclass
+from pathlib import Path
+
+from generate_webpage import BASE_FOLDER
+
+TEXT_STORE_PATH = Path(
+    os.environ.get("TEXT_STORE_PATH", BASE_FOLDER / ".search_text.sqlite3")
+)
+
+
+@dataclass(frozen=True)
+class StoredPage:
+    title: str
+    text: str
+    mtime_ns: int
+    size: int
+    sha256: str
+
+
+@dataclass(frozen=True)
+class ManifestEntry:
+    mtime_ns: int
+    size: int
+    sha256: str
+
+
+def page_title(html: str) -> str:
+    if not (match := re.search(r"<title>(.*?)</title>", html)):
+        return ""
+    return match.group(1).rsplit("-", maxsplit=1)[0].strip()
+
+
+class TextStore:
+    def __init__(self, path: Path) -> None:
+        self.path = path
+        self._local = threading.local()
+
+    def connect(self) -> sqlite3.Connection:
+        connection = sqlite3.connect(self.path)
+        connection.execute("PRAGMA journal_mode=WAL")
+        connection.execute(
+            """
+            CREATE TABLE IF NOT EXISTS pages (
+                key TEXT PRIMARY KEY,
+                title TEXT NOT NULL,
+                text TEXT NOT NULL,
+                mtime_ns INTEGER NOT NULL,
+                size INTEGER NOT NULL,
+                sha256 TEXT NOT NULL DEFAULT ''
+            )
+            """
+        )
+        connection.execute(
+            "CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value INTEGER)"
+        )
+        columns = {row[1] for row in connection.execute("PRAGMA table_info(pages)")}
+        if "sha256" not in columns:
+            connection.execute(
+                "ALTER TABLE pages ADD COLUMN sha256 TEXT NOT NULL DEFAULT ''"
+            )
+        return connection
+
+    def put(self, connection: sqlite3.Connection, key: str, page: StoredPage) -> None:
+        connection.execute(
+            "INSERT OR REPLACE INTO pages (key, title, text, mtime_ns, size, sha256)"
+            " VALUES (?, ?, ?, ?, ?, ?)",
+            (key, page.title, page.text, page.mtime_ns, page.size, page.sha256),
+        )
+
+    def touch(
+        self, connection: sqlite3.Connection, key: str, mtime_ns: int, size: int
+    ) -> None:
+        connection.execute(
+            "UPDATE pages SET mtime_ns = ?, size = ? WHERE key = ?",
+            (mtime_ns, size, key),
+        )
+
+    def delete(self, connection: sqlite3.Connection, key: str) -> None:
+        connection.execute("DELETE FROM pages WHERE key = ?", (key,))
+
+    def manifest(self, connection: sqlite3.Connection) -> dict[str, ManifestEntry]:
+        return {
+            key: ManifestEntry(mtime_ns, size, sha256)
+            for key, mtime_ns, size, sha256 in connection.execute(
+                "SELECT key, mtime_ns, size, sha256 FROM pages"
+            )
+        }
+
+    def bump_generation(self, connection: sqlite3.Connection) -> None:
+        connection.execute(
+            "INSERT INTO meta (key, value) VALUES ('generation', 1)"
+            " ON CONFLICT (key) DO UPDATE SET value = value + 1"
+        )
+
+    def texts(self, connection: sqlite3.Connection) -> Iterator[tuple[str, str]]:
+        yield from connection.execute("SELECT key, text FROM pages ORDER BY key")
+
+    def documents(
+        self, connection: sqlite3.Connection
+    ) -> Iterator[tuple[str, str, str]]:
+        yield from connection.execute("SELECT key, title, text FROM pages ORDER BY key")
+
+    def _reader(self) -> sqlite3.Connection | None:
+        if (connection := getattr(self._local, "connection", None)) is not None:
+            return connection
+        try:
+            connection = sqlite3.connect(
+                f"{self.path.absolute().as_uri()}?mode=ro", uri=True
+            )
+        except sqlite3.OperationalError:
+            return None
+        self._local.connection = connection
+        return connection
+
+    def generation(self) -> int:
+        if (connection := self._reader()) is None:
+            return 0
+        try:
+            row = connection.execute(
+                "SELECT value FROM meta WHERE key = 'generation'"
+            ).fetchone()
+        except sqlite3.OperationalError:
+            return 0
+        return 0 if row is None else row[0]
+
+    def get(self, key: str) -> StoredPage | None:
+        if (connection := self._reader()) is None:
+            return None
+        try:
+            row = connection.execute(
+                "SELECT title, text, mtime_ns, size, sha256 FROM pages WHERE key = ?",
+                (key,),
+            ).fetchone()
+        except sqlite3.OperationalError:
+            return None
+        if row is None:
+            return None
+        return StoredPage(*row)
+
+
+text_store = TextStore(TEXT_STORE_PATH)
@@ -0,0 +1,79 @@
+import json
+import os
+import tempfile
+import time
+from pathlib import Path
+
+from flask import Flask
+
+from embedded_index import SEARCH_BACKEND, embedded_index
+from generate_webpage import get_courses
+from metrics import registry
+from page_bundle import page_bundles
+from scoped_css import scoped_stylesheets
+from suggest_index import suggest_index
+
+WARMUP_PAGES = int(os.environ.get("WARMUP_PAGES", 3))
+READY_FILE = os.environ.get("READY_FILE")
+
+
+def warm_up(app: Flask) -> dict[str, float]:
+    start = time.perf_counter()
+    courses = get_courses()
+    templates = 0
+    if app.jinja_loader is not None:
+        for name in app.jinja_loader.list_templates():
+            app.jinja_env.get_template(name)
+            templates += 1
+    urls = ["/", "/notes/"]
+    bundles = 0
+    for course in courses:
+        folder = course.path / "HTML_paginated"
+        if not folder.is_dir():
+            continue
+        if page_bundles.get(folder) is not None:
+            bundles += 1
+        scoped_stylesheets.course(folder)
+        pages = sorted(folder.glob("*.html"))[:WARMUP_PAGES]
+        urls.extend(f"{course.url()}/HTML/{page.name}" for page in pages)
+    suggest_index.current()
+    if SEARCH_BACKEND == "embedded":
+        embedded_index.current()
+    client = app.test_client()
+    failed = 0
+    registry.flushing = False
+    try:
+        for url in urls:
+            if client.get(url, buffered=True).status_code >= 400:
+                failed += 1
+    finally:
+        registry.flushing = True
+        registry.reset()
+    return {
+        "courses": len(courses),
+        "templates": templates,
+        "bundles": bundles,
+        "pages": len(urls) - failed,
+        "failed": failed,
+        "seconds": round(time.perf_counter() - start, 3),
+    }
+
+
+def mark_ready(summary: dict[str, float]) -> None:
+    if READY_FILE is None:
+        return
+    path = Path(READY_FILE)
+    with tempfile.NamedTemporaryFile(
+        "w", dir=path.parent, prefix=f".{path.name}.", delete=False
+    ) as f:
+        try:
+            json.dump({"pid": os.getpid(), **summary}, f)
+        except BaseException:
+            os.unlink(f.name)
+            raise
+    os.replace(f.name, path)
+
+
+def mark_not_ready() -> None:
+    if READY_FILE is not None:
+        Path(READY_FILE).unlink(missing_ok=True)